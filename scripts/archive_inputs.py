@@ -0,0 +1,245 @@
+import os
+import re
+import time
+import tarfile
+import zipfile
+import posixpath
+import threading
+from collections import namedtuple, OrderedDict
+from typing import Dict, List, Tuple
+
+# File extensions read as archives of inputs
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+# Tar archives whose stream has to be decompressed from the start to go back to an earlier member
+COMPRESSED_TAR_EXTENSIONS = ('.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+# Separates the archive path from the member path, as in data.zip!/inner/image.jpg
+MEMBER_SEPARATOR = '!/'
+
+# Also matches the separator after Windows path normalisation turned it into !\
+MEMBER_SEPARATOR_PATTERN = re.compile(r'![/\\]')
+
+# The parts of a stat result used by the output index
+MemberStat = namedtuple('MemberStat', ['st_mtime_ns', 'st_size'])
+
+
+def is_archive(path: str) -> bool:
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def is_archive_member(path: str) -> bool:
+    parts = MEMBER_SEPARATOR_PATTERN.split(path, 1)
+    return len(parts) == 2 and is_archive(parts[0])
+
+
+def split_member(path: str) -> Tuple[str, str]:
+    """Split an archive member path into the archive path and the member name."""
+    archive_path, member = MEMBER_SEPARATOR_PATTERN.split(path, 1)
+    # Names inside archives always use forward slashes
+    return archive_path, member.replace('\\', '/')
+
+
+def archive_stem(archive_path: str) -> str:
+    """The archive path without its archive extension."""
+    lower = archive_path.lower()
+    for extension in sorted(ARCHIVE_EXTENSIONS, key=len, reverse=True):
+        if lower.endswith(extension):
+            return archive_path[:-len(extension)]
+    return archive_path
+
+
+def list_members(archive_path: str, extensions: Tuple[str, ...]) -> List[str]:
+    """
+    Return the member paths of the files in an archive that have a matching
+    extension. Archives that cannot be read have no members.
+    """
+    try:
+        if zipfile.is_zipfile(archive_path):
+            with zipfile.ZipFile(archive_path) as archive:
+                names = [info.filename for info in archive.infolist() if not info.is_dir()]
+        else:
+            with tarfile.open(archive_path) as archive:
+                names = [member.name for member in archive.getmembers() if member.isfile()]
+    except (OSError, zipfile.BadZipFile, tarfile.TarError):
+        return []
+    return [
+        f'{archive_path}{MEMBER_SEPARATOR}{name}' for name in names
+        if posixpath.splitext(name)[1].lower() in extensions
+    ]
+
+
+class TarCursor:
+    """
+    Read the members of a compressed tar in one pass. Members passed over on
+    the way to a later one are kept in memory, up to max_buffer_bytes, for the
+    requests that arrive slightly out of order. Only a member that was already
+    passed and not kept sends the stream back to the start.
+    """
+
+    def __init__(self, archive: tarfile.TarFile, max_buffer_bytes: int):
+        self.archive = archive
+        self.members = archive.getmembers()
+        self.order = {member.name: index for index, member in enumerate(self.members)}
+        self.max_buffer_bytes = max_buffer_bytes
+        self.position = 0
+        self.buffer: OrderedDict = OrderedDict()
+        self.buffer_bytes = 0
+        self.read_names = set()
+
+    def read(self, name: str) -> bytes:
+        data = self.buffer.pop(name, None)
+        if data is not None:
+            self.buffer_bytes -= len(data)
+            return data
+        index = self.order[name]
+        if index >= self.position:
+            for member in self.members[self.position:index]:
+                if member.isfile() and member.name not in self.read_names and member.size <= self.max_buffer_bytes:
+                    self._keep(member.name, self._extract(member))
+        data = self._extract(self.members[index])
+        self.position = index + 1
+        return data
+
+    def _extract(self, member: tarfile.TarInfo) -> bytes:
+        file = self.archive.extractfile(member)
+        if file is None:
+            raise KeyError(member.name)
+        self.read_names.add(member.name)
+        return file.read()
+
+    def _keep(self, name: str, data: bytes):
+        self.buffer[name] = data
+        self.buffer_bytes += len(data)
+        while self.buffer_bytes > self.max_buffer_bytes:
+            _, dropped = self.buffer.popitem(last=False)
+            self.buffer_bytes -= len(dropped)
+
+
+class ArchiveReader:
+    """
+    Read archive members into memory without extracting them. Archives are
+    opened once and kept open, and reads from the same archive are serialised
+    because tar files are not safe to read from several threads at once.
+    Compressed tars are read through a TarCursor, so inputs in the order of
+    in_stored_order decompress each archive once.
+    """
+
+    def __init__(self, max_buffer_bytes: int = 64 * 1024 * 1024):
+        self.max_buffer_bytes = max_buffer_bytes
+        self._archives: Dict[str, Tuple[object, threading.Lock]] = {}
+        self._lock = threading.Lock()
+
+    def _open(self, archive_path: str):
+        with self._lock:
+            if archive_path not in self._archives:
+                try:
+                    if zipfile.is_zipfile(archive_path):
+                        archive = zipfile.ZipFile(archive_path)
+                    elif archive_path.lower().endswith(COMPRESSED_TAR_EXTENSIONS):
+                        archive = TarCursor(tarfile.open(archive_path), self.max_buffer_bytes)
+                    else:
+                        archive = tarfile.open(archive_path)
+                except (zipfile.BadZipFile, tarfile.TarError) as e:
+                    raise OSError(f'Could not read archive {archive_path}: {e}')
+                self._archives[archive_path] = (archive, threading.Lock())
+            return self._archives[archive_path]
+
+    def read(self, path: str) -> bytes:
+        """Return the contents of an archive member."""
+        archive_path, member = split_member(path)
+        archive, lock = self._open(archive_path)
+        with lock:
+            if isinstance(archive, (zipfile.ZipFile, TarCursor)):
+                return archive.read(member)
+            file = archive.extractfile(member)
+            if file is None:
+                raise KeyError(member)
+            return file.read()
+
+    def stat(self, path: str) -> MemberStat:
+        """Return the modification time and size of an archive member, like os.stat does for files."""
+        archive_path, member = split_member(path)
+        archive, lock = self._open(archive_path)
+        with lock:
+            try:
+                if isinstance(archive, zipfile.ZipFile):
+                    info = archive.getinfo(member)
+                    return MemberStat(int(time.mktime(info.date_time + (0, 0, -1))) * 10**9, info.file_size)
+                if isinstance(archive, TarCursor):
+                    archive = archive.archive
+                info = archive.getmember(member)
+                return MemberStat(int(info.mtime) * 10**9, info.size)
+            except KeyError:
+                raise FileNotFoundError(f'No member {member} in {archive_path}')
+
+    def in_stored_order(self, paths: List[str]) -> List[str]:
+        """
+        Return the paths with the members of each compressed tar moved into the
+        order they are stored in. Other paths keep their place.
+        """
+        slots: Dict[str, List[int]] = {}
+        for position, path in enumerate(paths):
+            if is_archive_member(path) and split_member(path)[0].lower().endswith(COMPRESSED_TAR_EXTENSIONS):
+                slots.setdefault(split_member(path)[0], []).append(position)
+        ordered = list(paths)
+        for archive_path, positions in slots.items():
+            try:
+                cursor, _ = self._open(archive_path)
+            except OSError:
+                continue
+            members = sorted((paths[position] for position in positions),
+                             key=lambda path: cursor.order.get(split_member(path)[1], -1))
+            for position, path in zip(positions, members):
+                ordered[position] = path
+        return ordered
+
+    def close(self):
+        with self._lock:
+            for archive, _ in self._archives.values():
+                if isinstance(archive, TarCursor):
+                    archive = archive.archive
+                archive.close()
+            self._archives = {}
+
+
+class CaptionArchives:
+    """
+    Zip archives that captions are added to, kept open for the length of a run.
+    Each archive is written to a temporary file; on close the captions of earlier
+    runs that were not written again are copied over and the file replaces the
+    archive, so a rerun never leaves two members with the same name.
+    """
+
+    def __init__(self):
+        self._archives: Dict[str, Tuple[str, zipfile.ZipFile, set]] = {}
+        self._lock = threading.Lock()
+
+    def write(self, zip_path: str, name: str, text: str) -> str:
+        """Add a caption to the zip archive and return its member path."""
+        with self._lock:
+            if zip_path not in self._archives:
+                temp_path = f'{zip_path}.{os.getpid()}.tmp'
+                self._archives[zip_path] = (
+                    temp_path, zipfile.ZipFile(temp_path, 'w', compression=zipfile.ZIP_DEFLATED), set())
+            _, archive, names = self._archives[zip_path]
+            # A caption written twice in one run keeps its first version
+            if name not in names:
+                archive.writestr(name, text)
+                names.add(name)
+        return f'{zip_path}{MEMBER_SEPARATOR}{name}'
+
+    def close(self):
+        with self._lock:
+            for zip_path, (temp_path, archive, names) in self._archives.items():
+                try:
+                    with zipfile.ZipFile(zip_path) as previous:
+                        for info in previous.infolist():
+                            if info.filename not in names:
+                                archive.writestr(info, previous.read(info))
+                                names.add(info.filename)
+                except FileNotFoundError:
+                    pass
+                archive.close()
+                os.replace(temp_path, zip_path)
+            self._archives = {}
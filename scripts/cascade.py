@@ -0,0 +1,56 @@
+import threading
+from collections import namedtuple, Counter
+from typing import Dict, List, Optional
+
+# One configuration an input can be captioned with: the model, the resolution
+# images are sent at (0 for the Max Resolution setting) and the detail level
+# (empty for the prompt's own)
+CascadeStage = namedtuple('CascadeStage', ['name', 'model', 'resolution', 'detail'])
+
+
+class CaptionRefused(ValueError):
+    """The model answered with a refusal instead of a caption."""
+
+
+def check_caption(text: str, min_words: int = 0, keywords: List[str] = ()) -> Optional[str]:
+    """
+    Return why a caption of the cheap stage should be escalated, or None if it
+    passes: 'short' when it has fewer than min_words words, 'keywords' when a
+    required keyword is missing (case insensitive).
+    """
+    if min_words > 0 and len(text.split()) < min_words:
+        return 'short'
+    lower = text.lower()
+    if any(keyword.lower() not in lower for keyword in keywords):
+        return 'keywords'
+    return None
+
+
+class CascadeStats:
+    """Requests, cost and latency of each cascade stage, and why inputs were escalated."""
+
+    def __init__(self):
+        self.requests: Counter = Counter()
+        self.cost: Dict[str, float] = Counter()
+        self.latency: Dict[str, float] = Counter()
+        self.escalations: Counter = Counter()
+        self.inputs = 0
+        self._lock = threading.Lock()
+
+    def record_request(self, stage: str, cost: float, latency: float):
+        with self._lock:
+            self.requests[stage] += 1
+            self.cost[stage] += cost
+            self.latency[stage] += latency
+
+    def record_input(self, escalation_reason: Optional[str] = None):
+        with self._lock:
+            self.inputs += 1
+            if escalation_reason:
+                self.escalations[escalation_reason] += 1
+
+    def average_cost(self, stage: str) -> float:
+        return self.cost[stage] / self.requests[stage] if self.requests[stage] else 0.0
+
+    def average_latency(self, stage: str) -> float:
+        return self.latency[stage] / self.requests[stage] if self.requests[stage] else 0.0
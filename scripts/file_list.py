@@ -0,0 +1,81 @@
+import os
+import bisect
+import heapq
+from typing import Iterable, List, Tuple
+from archive_inputs import MEMBER_SEPARATOR, is_archive, is_archive_member, list_members, split_member
+
+# File extensions accepted as local image inputs
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp')
+
+
+def expand_paths(paths: Iterable[str], extensions: Tuple[str, ...] = IMAGE_EXTENSIONS) -> Tuple[List[str], int]:
+    """
+    Expand dropped or selected paths into the files to process.
+    Folders are walked recursively and only files with a matching extension are kept.
+    Archives are expanded into their image members, as archive.zip!/inner/path.jpg.
+    Returns the files and the number of folders and archives that were expanded.
+    """
+    files = []
+    folder_count = 0
+    for path in paths:
+        if os.path.isdir(path):
+            folder_count += 1
+            for dirpath, _, filenames in os.walk(path):
+                files.extend(
+                    os.path.join(dirpath, filename) for filename in filenames
+                    if os.path.splitext(filename)[1].lower() in extensions
+                )
+        elif is_archive(path) and os.path.isfile(path):
+            folder_count += 1
+            files.extend(list_members(path, tuple(ext for ext in extensions if ext in IMAGE_EXTENSIONS)))
+        elif os.path.splitext(path)[1].lower() in extensions:
+            files.append(path)
+    return files, folder_count
+
+
+def absolute_path(path: str) -> str:
+    """
+    The absolute path of a file or archive member. Only the archive part of a
+    member path is normalised, so the separator survives Windows paths.
+    """
+    if is_archive_member(path):
+        archive_path, member = split_member(path)
+        return os.path.abspath(archive_path) + MEMBER_SEPARATOR + member
+    return os.path.abspath(path)
+
+
+class FileListModel:
+    """Sorted, de-duplicated list of absolute file paths."""
+
+    def __init__(self):
+        self._items: List[str] = []
+        self._members = set()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, index: int) -> str:
+        return self._items[index]
+
+    def add(self, paths: Iterable[str]) -> int:
+        """Add paths that are not in the list yet. Returns the number of paths added."""
+        new_items = sorted({absolute_path(path) for path in paths} - self._members)
+        if not new_items:
+            return 0
+
+        self._members.update(new_items)
+        if len(new_items) < 64:
+            for path in new_items:
+                bisect.insort(self._items, path)
+        else:
+            # Merging two sorted lists is linear, unlike inserting one by one
+            self._items = list(heapq.merge(self._items, new_items))
+        return len(new_items)
+
+    def clear(self):
+        self._items = []
+        self._members = set()
+
+    def items(self) -> List[str]:
+        """Return a copy of the paths in sorted order."""
+        return list(self._items)
@@ -0,0 +1,70 @@
+import tkinter as tk
+from tkinter import ttk, font as tkfont
+
+
+class VirtualListView(ttk.Frame):
+    """
+    Read-only list view that only draws the rows currently visible, so it stays
+    responsive with hundreds of thousands of entries. The rows are read from a
+    model supporting len() and indexing, such as FileListModel.
+    """
+
+    def __init__(self, parent, model, placeholder='', height=6, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.model = model
+        self.placeholder = placeholder
+        self.top = 0
+        self.font = tkfont.nametofont('TkTextFont')
+        self.row_height = self.font.metrics('linespace') + 2
+
+        self.scrollbar = ttk.Scrollbar(self, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.canvas = tk.Canvas(
+            self,
+            height=height * self.row_height,
+            background='white',
+            highlightthickness=1,
+            highlightbackground='gray'
+        )
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+
+        self.canvas.bind('<Configure>', lambda event: self.refresh())
+        self.canvas.bind('<MouseWheel>', self.on_mousewheel)
+        self.canvas.bind('<Button-4>', lambda event: self.yview('scroll', -3, 'units'))
+        self.canvas.bind('<Button-5>', lambda event: self.yview('scroll', 3, 'units'))
+
+    def visible_rows(self):
+        return max(1, self.canvas.winfo_height() // self.row_height)
+
+    def yview(self, *args):
+        """Scroll the view, with the same arguments a scrollbar passes to its command."""
+        count = len(self.model)
+        rows = self.visible_rows()
+        if args[0] == 'moveto':
+            self.top = int(float(args[1]) * count)
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= rows
+            self.top += amount
+        self.refresh()
+
+    def on_mousewheel(self, event):
+        self.yview('scroll', -3 * int(event.delta / 120) if abs(event.delta) >= 120 else -event.delta, 'units')
+
+    def refresh(self):
+        """Redraw the visible rows and update the scrollbar."""
+        self.canvas.delete('all')
+        count = len(self.model)
+        rows = self.visible_rows()
+        self.top = max(0, min(self.top, count - rows))
+
+        if not count:
+            self.canvas.create_text(4, 1, anchor='nw', text=self.placeholder, fill='gray', font=self.font)
+            self.scrollbar.set(0, 1)
+            return
+
+        for row, index in enumerate(range(self.top, min(count, self.top + rows + 1))):
+            self.canvas.create_text(4, row * self.row_height + 1, anchor='nw', text=self.model[index], font=self.font)
+        self.scrollbar.set(self.top / count, min(1.0, (self.top + rows) / count))
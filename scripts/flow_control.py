@@ -0,0 +1,317 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+
+class PayloadBudget:
+    """
+    Cap the total number of encoded payload bytes held by in-flight requests.
+    A single payload larger than the whole budget is still allowed through on
+    its own, so one oversized image can never block a run forever.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+        self.peak = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, nbytes: int) -> int:
+        """Block until nbytes fit in the budget. Returns the number of bytes reserved."""
+        if self.max_bytes <= 0 or nbytes <= 0:
+            return 0
+        nbytes = min(nbytes, self.max_bytes)
+        with self._condition:
+            while self.in_flight > 0 and self.in_flight + nbytes > self.max_bytes:
+                self._condition.wait()
+            self.in_flight += nbytes
+            self.peak = max(self.peak, self.in_flight)
+        return nbytes
+
+    def adjust(self, delta: int):
+        """Correct a reservation once the real payload size is known, without blocking."""
+        if self.max_bytes <= 0 or delta == 0:
+            return
+        with self._condition:
+            self.in_flight = max(0, self.in_flight + delta)
+            self.peak = max(self.peak, self.in_flight)
+            if delta < 0:
+                self._condition.notify_all()
+
+    def release(self, nbytes: int):
+        """Return reserved bytes to the budget and wake up waiting workers."""
+        if self.max_bytes <= 0 or nbytes <= 0:
+            return
+        with self._condition:
+            self.in_flight = max(0, self.in_flight - nbytes)
+            self._condition.notify_all()
+
+
+class ConcurrencyController:
+    """
+    AIMD (additive-increase, multiplicative-decrease) controller for the number of
+    requests in flight. Successes with normal latency and spare rate limit add
+    about one slot per round of requests; 429 responses, rising error rates and
+    latency spikes cut the limit.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: Optional[int] = None,
+                 latency_tolerance: float = 2.0, decrease_factor: float = 0.5,
+                 error_rate_threshold: float = 0.2, headroom_threshold: float = 0.1):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum if maximum is not None else initial)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.error_rate_threshold = error_rate_threshold
+        self.headroom_threshold = headroom_threshold
+        self.base_latency = None
+        self.headroom = 1.0
+        self.last_decrease = 0.0
+        self.outcomes = deque(maxlen=20)
+        self._lock = threading.Lock()
+
+    @property
+    def current(self) -> int:
+        """The number of requests allowed in flight right now."""
+        return int(self.limit)
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.outcomes.append(True)
+            # Track a slowly rising floor of the observed latency
+            if self.base_latency is None:
+                self.base_latency = latency
+            else:
+                self.base_latency = min(latency, self.base_latency * 1.05)
+
+            if latency > self.base_latency * self.latency_tolerance:
+                self._decrease(0.9)
+            elif self.headroom > self.headroom_threshold:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def record_error(self, rate_limited: bool = False):
+        with self._lock:
+            self.outcomes.append(False)
+            if rate_limited:
+                self._decrease(self.decrease_factor)
+            elif self.outcomes.count(False) / len(self.outcomes) > self.error_rate_threshold:
+                self._decrease(0.75)
+
+    def record_headers(self, headers):
+        """Read the x-ratelimit-* headers of a response to track the remaining quota."""
+        headroom = []
+        for kind in ('requests', 'tokens'):
+            try:
+                remaining = float(headers.get(f'x-ratelimit-remaining-{kind}'))
+                limit = float(headers.get(f'x-ratelimit-limit-{kind}'))
+            except (TypeError, ValueError):
+                continue
+            if limit > 0:
+                headroom.append(remaining / limit)
+        if headroom:
+            with self._lock:
+                self.headroom = min(headroom)
+                if self.headroom < self.headroom_threshold / 2:
+                    self._decrease(0.9)
+
+    def _decrease(self, factor: float):
+        # Only cut once per round trip so one burst of errors does not collapse the limit
+        now = time.monotonic()
+        if now - self.last_decrease < (self.base_latency or 1.0):
+            return
+        self.last_decrease = now
+        self.limit = max(float(self.minimum), self.limit * factor)
+
+
+def start_request_thread(fn: Callable, *args) -> Future:
+    """
+    Run fn(*args) in a daemon thread and return a Future for its result. Unlike
+    a thread pool, the interpreter does not wait for these threads on exit, so a
+    request whose result is no longer needed never delays the end of a run.
+    """
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+class RunCancelled(Exception):
+    """Raised in a worker when the run was cancelled before its request was sent."""
+
+
+class RunControl:
+    """Cooperative pause, resume and cancel signals shared by the scheduler and the workers."""
+
+    def __init__(self):
+        self._running = threading.Event()
+        self._running.set()
+        self._cancelled = threading.Event()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def cancel(self):
+        self._cancelled.set()
+        # Wake up anything waiting on a pause so it can see the cancel
+        self._running.set()
+
+    def is_paused(self) -> bool:
+        return not self._running.is_set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def wait_while_paused(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the run is resumed. Returns False if still paused after the timeout."""
+        return self._running.wait(timeout)
+
+    def checkpoint(self):
+        """Block while paused and raise RunCancelled once the run is cancelled."""
+        self._running.wait()
+        if self._cancelled.is_set():
+            raise RunCancelled()
+
+
+class HedgePolicy:
+    """
+    Decide when a slow request gets a duplicate. A request is hedged once it has
+    run longer than the given percentile of recent latencies, and the number of
+    hedges in a run is capped at a share of its requests.
+    """
+
+    def __init__(self, budget_fraction: float, total_requests: int, percentile: float = 0.95,
+                 min_samples: int = 20, window: int = 200):
+        self.max_hedges = int(max(0.0, budget_fraction) * total_requests)
+        self.percentile = min(max(percentile, 0.5), 0.999)
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+        self.hedges = 0
+        self.wins = 0
+        self.time_saved = 0.0
+        self.longest_saving = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_hedges > 0
+
+    def record_latency(self, latency: float):
+        with self._lock:
+            self.latencies.append(latency)
+
+    def threshold(self) -> Optional[float]:
+        """The run time after which a request is hedged, or None until enough latencies were seen."""
+        with self._lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+
+    def try_acquire(self) -> bool:
+        """Take one hedge from the budget. Returns False once the budget is used up."""
+        with self._lock:
+            if self.hedges >= self.max_hedges:
+                return False
+            self.hedges += 1
+            return True
+
+    def record_win(self):
+        with self._lock:
+            self.wins += 1
+
+    def record_saving(self, seconds: float):
+        """Record how much earlier a hedge finished than the request it duplicated."""
+        with self._lock:
+            self.time_saved += seconds
+            self.longest_saving = max(self.longest_saving, seconds)
+
+
+class SpendGovernor:
+    """
+    Keep a run within a dollar cap and a token cap. Actual usage is recorded as
+    responses arrive and the projected cost of every request in flight is
+    reserved, so a new request is refused as soon as it could push the run
+    over a cap. A cap of 0 is no cap.
+    """
+
+    def __init__(self, max_cost: float = 0.0, max_tokens: int = 0,
+                 input_token_cost: float = 0.0, output_token_cost: float = 0.0, min_samples: int = 3):
+        self.max_cost = max_cost
+        self.max_tokens = max_tokens
+        self.input_token_cost = input_token_cost
+        self.output_token_cost = output_token_cost
+        self.min_samples = min_samples
+        self.spent_cost = 0.0
+        self.spent_tokens = 0
+        self.reserved_cost = 0.0
+        self.reserved_tokens = 0
+        self.completed = 0
+        self.refused = False
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_cost > 0 or self.max_tokens > 0
+
+    def record_usage(self, prompt_tokens: int, completion_tokens: int, cost: Optional[float] = None):
+        """Record the usage of a response, at the given cost or at the default token costs."""
+        if cost is None:
+            cost = prompt_tokens * self.input_token_cost + completion_tokens * self.output_token_cost
+        with self._lock:
+            self.spent_tokens += prompt_tokens + completion_tokens
+            self.spent_cost += cost
+
+    def reserve(self, prompt_tokens: int, completion_tokens: int, weight: int = 1):
+        """
+        Reserve the projected cost of one input before it is sent. The projection
+        is the average actual cost per input once a few inputs completed, and the
+        given worst case estimate before that. Returns the reservation, or None if
+        it does not fit next to the reservations in flight. Once it would exceed
+        a cap on its own, refused is set and every later reservation fails.
+        """
+        with self._lock:
+            if self.completed >= self.min_samples:
+                tokens = self.spent_tokens / self.completed
+                cost = self.spent_cost / self.completed
+            else:
+                tokens = prompt_tokens + completion_tokens
+                cost = prompt_tokens * self.input_token_cost + completion_tokens * self.output_token_cost
+            tokens, cost = tokens * weight, cost * weight
+
+            if self.refused or not self._fits(cost, tokens):
+                self.refused = True
+                return None
+            if not self._fits(self.reserved_cost + cost, self.reserved_tokens + tokens):
+                return None
+            self.reserved_cost += cost
+            self.reserved_tokens += tokens
+            return tokens, cost
+
+    def _fits(self, cost: float, tokens: float) -> bool:
+        return (self.max_cost <= 0 or self.spent_cost + cost <= self.max_cost) and \
+            (self.max_tokens <= 0 or self.spent_tokens + tokens <= self.max_tokens)
+
+    def release(self, reservation, completed: bool = True):
+        """Return a reservation once its request finished, and its usage was recorded."""
+        if reservation is None:
+            return
+        tokens, cost = reservation
+        with self._lock:
+            self.reserved_tokens = max(0, self.reserved_tokens - tokens)
+            self.reserved_cost = max(0.0, self.reserved_cost - cost)
+            if completed:
+                self.completed += 1
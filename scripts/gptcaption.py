@@ -1,56 +1,218 @@
-import tkinter as tk
-from tkinter import scrolledtext, messagebox, ttk, filedialog
-from tkinterdnd2 import DND_FILES, TkinterDnD
 import os
+import sys
 import datetime
-from openai import OpenAI
 import threading
 import urllib.parse
-from concurrent.futures import ThreadPoolExecutor
 import time
 import base64
-from PIL import Image
 import io
 import json
-from tqdm import tqdm
+import math
+import posixpath
+from collections import namedtuple
+from types import SimpleNamespace
 from string_utils import strings
-from dotenv import load_dotenv, set_key
+from flow_control import PayloadBudget, ConcurrencyController, RunControl, RunCancelled, HedgePolicy
+from flow_control import start_request_thread, SpendGovernor
+from key_pool import ApiKey, KeyPool, PoolExhausted
+from output_index import OutputIndex, hash_prompt
+from output_budget import OutputBudgets
+from file_list import FileListModel, IMAGE_EXTENSIONS, expand_paths
+from run_stats import RunStats, write_status_file, format_duration
+from video_frames import VIDEO_EXTENSIONS, VideoFrame, is_video, sample_frames, is_available as video_support_available
+from archive_inputs import ARCHIVE_EXTENSIONS, ArchiveReader, CaptionArchives, is_archive_member, split_member, archive_stem
+from output_layout import OutputLayout, write_text_atomic
+from url_preflight import PreflightCache, preflight_urls
+from cascade import CascadeStage, CascadeStats, CaptionRefused, check_caption
+from quota_ledger import QuotaLedger
+from payload_cache import PayloadCache
+
+# Heavy dependencies (openai, PIL, tqdm, dotenv, tkinter, tkinterdnd2) are imported
+# on the code paths that need them, so the command line entry points start quickly.
 
 # Get the script directory
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Load environment variables from scripts directory
-load_dotenv(os.path.join(SCRIPT_DIR, '.env'))
-
-# Global Settings
-MAX_CONSECUTIVE_ERRORS = int(os.getenv('MAX_CONSECUTIVE_ERRORS', '5'))  # Default to 5, 0 or -1 to disable
+# Directory for persistent run state such as the output index
+CACHE_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), 'cache')
+
+# Global Settings (populated by load_environment)
+MAX_CONSECUTIVE_ERRORS = 5  # Default to 5, 0 or -1 to disable
+MAX_PAYLOAD_MB = 64  # Cap on encoded image bytes held by in-flight requests, 0 to disable
+PAYLOAD_CACHE_MB = 1024  # Disk space for resized and encoded images reused by later runs, 0 to disable
+INITIAL_CONCURRENCY = 10  # Parallel requests at the start of a batch run
+MAX_CONCURRENCY = 32  # Upper bound for the adaptive number of parallel requests
+CANCEL_DEADLINE = 30  # Seconds to wait for in-flight requests after a cancel
+STATUS_FILE = ''  # JSON file rewritten with live run statistics, empty to disable
+STATUS_INTERVAL = 5  # Seconds between status file updates
+HEDGE_BUDGET_PERCENT = 0  # Duplicate requests allowed for slow requests, as a percentage of the run, 0 to disable
+HEDGE_PERCENTILE = 95  # Latency percentile after which a request is hedged
+MAX_RUN_COST = 0  # Dollar cap on the actual spend of a run, 0 for no cap
+MAX_RUN_TOKENS = 0  # Token cap on a run, 0 for no cap
+MAX_COMPLETION_TOKENS = 300  # max_tokens of a request until enough captions of its prompt were seen
+ADAPTIVE_MAX_TOKENS = True  # Learn max_tokens per prompt from the caption lengths of earlier runs
+MAX_ADAPTIVE_TOKENS = 1024  # Upper bound of a learned max_tokens
+CONTINUE_TRUNCATED = False  # Send a continuation request when a caption is cut off at max_tokens
+
+# Cascade settings: every input goes through the cheap stage first and is sent
+# to the strong stage only when its caption fails the checks
+CASCADE_ENABLED = False
+CASCADE_CHEAP_MODEL = 'gpt-4o-mini'
+CASCADE_CHEAP_RESOLUTION = 512   # 0 for the Max Resolution setting
+CASCADE_CHEAP_DETAIL = 'low'     # Empty for the prompt's detail level
+CASCADE_STRONG_MODEL = 'gpt-4o'
+CASCADE_STRONG_RESOLUTION = 0
+CASCADE_STRONG_DETAIL = ''
+CASCADE_MIN_WORDS = 8            # Captions with fewer words are escalated, 0 to disable
+CASCADE_REQUIRED_KEYWORDS = ''   # Comma separated words every caption must contain
+
+# URL preflight settings
+URL_PREFLIGHT = True           # Check web URLs for reachability, content type and size before a run
+URL_PREFLIGHT_CONCURRENCY = 16 # URLs checked in parallel
+URL_PREFLIGHT_TIMEOUT = 10     # Seconds before a URL check gives up
+URL_PREFLIGHT_TTL_HOURS = 24   # How long a URL check result is reused
+URL_MAX_MB = 20                # Largest image accepted from a URL, 0 for no limit
+QUOTA_LEDGER = True            # Count requests, tokens and cost per key per day across runs and processes
+
+# Video settings
+VIDEO_SAMPLING = 'interval'    # 'interval' takes a frame every VIDEO_FRAME_INTERVAL seconds, 'scene' on scene changes
+VIDEO_FRAME_INTERVAL = 5       # Seconds between sampled frames
+VIDEO_SCENE_THRESHOLD = 0.4    # Histogram distance (0 to 1) that counts as a scene change
+VIDEO_MAX_FRAMES = 8           # Most frames sampled from one video
+VIDEO_CAPTION_MODE = 'clip'    # 'clip' sends all frames in one request, 'frame' captions each frame
+VIDEO_DECODE_WORKERS = 2       # Processes decoding videos
+
+# Local files accepted as inputs
+INPUT_EXTENSIONS = IMAGE_EXTENSIONS + VIDEO_EXTENSIONS
+ARCHIVE_OUTPUT = 'directory'   # Captions of archive members go to a sibling 'directory' or a new 'zip' archive
+OUTPUT_LAYOUT = 'flat'         # Captions in the run folder are 'flat', 'sharded' by input hash or 'mirror' the input tree
 
 # Token cost settings (GPT-4o mini)
+MODEL = 'gpt-4o-mini'
 TOKEN_COST_INPUT = 0.00000015   # $0.150 per 1M tokens
 TOKEN_COST_OUTPUT = 0.00000060  # $0.600 per 1M tokens
 
+# Token costs (input, output) per model; other models are costed like GPT-4o mini
+MODEL_TOKEN_COSTS = {
+    'gpt-4o-mini': (TOKEN_COST_INPUT, TOKEN_COST_OUTPUT),
+    'gpt-4o': (0.0000025, 0.00001),     # $2.50 and $10.00 per 1M tokens
+    'gpt-4.1-mini': (0.0000004, 0.0000016),
+    'gpt-4.1': (0.000002, 0.000008),
+}
+
 # Global variables for error tracking
 consecutive_errors = 0
 failed_files = []
 
+# Image token settings (GPT-4o mini vision pricing)
+IMAGE_TOKENS_BASE = 2833       # Tokens billed per image at low detail, and added at high detail
+IMAGE_TOKENS_PER_TILE = 5667   # Tokens billed per 512px tile at high detail
+IMAGE_TILE_SIZE = 512
+IMAGE_MAX_SIDE = 2048          # The API fits images within 2048x2048 ...
+IMAGE_SHORT_SIDE = 768         # ... then scales the shortest side down to 768
+RESIZE_POLICY = 'tile'         # 'tile' snaps to the tile grid, 'longest_edge' only limits the longest edge
+TILE_SNAP_TOLERANCE = 0.15     # Largest extra downscale allowed to save a tile
+IMAGE_DETAIL = 'auto'          # Default detail level when the preset does not set one
+
 # Global variables for token tracking
 total_prompt_tokens = 0
 total_completion_tokens = 0
 total_tokens = 0
+total_input_cost = 0.0
+total_output_cost = 0.0
+total_image_tokens_saved = 0
+usage_lock = threading.Lock()
+
+# Requests, cost and escalations of each cascade stage (created per run)
+cascade_stats = CascadeStats()
+
+# Global variables for streaming statistics
+time_to_first_token = []
+refusals_cancelled = 0
+
+# Global variables for truncation statistics
+captions_requested = 0
+truncated_captions = 0
+continued_captions = 0
 
 # Global variables for progress tracking
 total_images = 0
 processed_images = 0
 time_folder = None
 
+# Shared OpenAI clients per API key (created on first use)
+openai_clients = {}
+openai_clients_lock = threading.Lock()
+
+# API keys of the current run with their limiter state (created per run)
+key_pool = KeyPool([])
+
+# Daily usage per key shared with other runs and processes (opened on first use)
+quota_ledger = None
+
+# Encoded images of earlier runs (loaded on first use)
+payload_cache = None
+
+# Memory budget for encoded image payloads (created per run)
+payload_budget = PayloadBudget(0)
+
+# Adaptive limit on requests in flight (created per run)
+concurrency_controller = ConcurrencyController(initial=1)
+
+# Pause, resume and cancel signals for the current run
+run_control = RunControl()
+
+# Live throughput statistics of the current run
+run_stats = RunStats(0)
+
+# Duplicate requests for stragglers (created per run)
+hedge_policy = HedgePolicy(0, 0)
+
+# Dollar and token caps of the current run (created per run)
+spend_governor = SpendGovernor()
+
+# Worker processes decoding videos (started on first use)
+video_pool = None
+video_pool_lock = threading.Lock()
+
+# Archives that inputs are read from and captions are written to
+archive_reader = ArchiveReader()
+caption_archives = CaptionArchives()
+
+# Where captions go in the output folder of the current run (created per run)
+output_layout = None
+
+# Index of inputs captioned in previous runs (loaded on first use)
+output_index = None
+
+# Caption lengths of earlier runs per prompt (loaded on first use)
+output_budgets = None
+
+# GUI modules (imported by build_gui)
+tk = None
+ttk = None
+messagebox = None
+filedialog = None
+
 # GUI variables (will be initialized later)
 root = None
 status_label = None
+dashboard_label = None
 progress_var = None
 generate_button = None
+pause_button = None
+cancel_button = None
 web_text_area = None
-local_text_area = None
+local_file_view = None
+local_summary_label = None
 instructions_entry = None
+save_local_checkbox = None
+overwrite_checkbox = None
+prompts = []
+prompt_var = None
+
+# Local files selected for captioning
+local_files = FileListModel()
 
 # Variables for settings
 batch_var = None
@@ -59,18 +221,79 @@ save_local_var = None
 overwrite_var = None
 resolution_var = None
 tier_var = None
+stream_var = None
+
+def load_environment():
+    """Load the .env file and the settings that depend on it."""
+    global MAX_CONSECUTIVE_ERRORS, MAX_PAYLOAD_MB, RESIZE_POLICY, TILE_SNAP_TOLERANCE, IMAGE_DETAIL, PAYLOAD_CACHE_MB
+    global INITIAL_CONCURRENCY, MAX_CONCURRENCY, CANCEL_DEADLINE, CACHE_DIR, STATUS_FILE, STATUS_INTERVAL
+    global HEDGE_BUDGET_PERCENT, HEDGE_PERCENTILE, MAX_RUN_COST, MAX_RUN_TOKENS, VIDEO_SAMPLING
+    global MAX_COMPLETION_TOKENS, ADAPTIVE_MAX_TOKENS, CONTINUE_TRUNCATED, VIDEO_FRAME_INTERVAL, VIDEO_SCENE_THRESHOLD
+    global VIDEO_MAX_FRAMES, VIDEO_CAPTION_MODE, VIDEO_DECODE_WORKERS, ARCHIVE_OUTPUT, OUTPUT_LAYOUT
+    global URL_PREFLIGHT, URL_PREFLIGHT_CONCURRENCY, URL_PREFLIGHT_TIMEOUT, URL_PREFLIGHT_TTL_HOURS, URL_MAX_MB
+    global CASCADE_ENABLED, CASCADE_CHEAP_MODEL, CASCADE_CHEAP_RESOLUTION, CASCADE_CHEAP_DETAIL, CASCADE_STRONG_MODEL
+    global CASCADE_STRONG_RESOLUTION, CASCADE_STRONG_DETAIL, CASCADE_MIN_WORDS, CASCADE_REQUIRED_KEYWORDS, QUOTA_LEDGER
+    from dotenv import load_dotenv
+
+    # Load environment variables from scripts directory
+    load_dotenv(os.path.join(SCRIPT_DIR, '.env'))
+    MAX_CONSECUTIVE_ERRORS = int(os.getenv('MAX_CONSECUTIVE_ERRORS', '5'))
+    MAX_PAYLOAD_MB = float(os.getenv('MAX_PAYLOAD_MB', '64'))
+    PAYLOAD_CACHE_MB = float(os.getenv('PAYLOAD_CACHE_MB', '1024'))
+    RESIZE_POLICY = os.getenv('RESIZE_POLICY', 'tile').lower()
+    TILE_SNAP_TOLERANCE = float(os.getenv('TILE_SNAP_TOLERANCE', '0.15'))
+    IMAGE_DETAIL = os.getenv('IMAGE_DETAIL', 'auto').lower()
+    INITIAL_CONCURRENCY = int(os.getenv('INITIAL_CONCURRENCY', '10'))
+    MAX_CONCURRENCY = int(os.getenv('MAX_CONCURRENCY', '32'))
+    CANCEL_DEADLINE = float(os.getenv('CANCEL_DEADLINE', '30'))
+    CACHE_DIR = os.getenv('CACHE_DIR', CACHE_DIR)
+    STATUS_FILE = os.getenv('STATUS_FILE', '')
+    STATUS_INTERVAL = float(os.getenv('STATUS_INTERVAL', '5'))
+    HEDGE_BUDGET_PERCENT = float(os.getenv('HEDGE_BUDGET_PERCENT', '0'))
+    HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '95'))
+    MAX_RUN_COST = float(os.getenv('MAX_RUN_COST', '0'))
+    MAX_RUN_TOKENS = int(os.getenv('MAX_RUN_TOKENS', '0'))
+    MAX_COMPLETION_TOKENS = int(os.getenv('MAX_COMPLETION_TOKENS', '300'))
+    ADAPTIVE_MAX_TOKENS = os.getenv('ADAPTIVE_MAX_TOKENS', 'true').lower() == 'true'
+    CONTINUE_TRUNCATED = os.getenv('CONTINUE_TRUNCATED', 'false').lower() == 'true'
+    VIDEO_SAMPLING = os.getenv('VIDEO_SAMPLING', 'interval').lower()
+    VIDEO_FRAME_INTERVAL = float(os.getenv('VIDEO_FRAME_INTERVAL', '5'))
+    VIDEO_SCENE_THRESHOLD = float(os.getenv('VIDEO_SCENE_THRESHOLD', '0.4'))
+    VIDEO_MAX_FRAMES = int(os.getenv('VIDEO_MAX_FRAMES', '8'))
+    VIDEO_CAPTION_MODE = os.getenv('VIDEO_CAPTION_MODE', 'clip').lower()
+    VIDEO_DECODE_WORKERS = int(os.getenv('VIDEO_DECODE_WORKERS', '2'))
+    ARCHIVE_OUTPUT = os.getenv('ARCHIVE_OUTPUT', 'directory').lower()
+    OUTPUT_LAYOUT = os.getenv('OUTPUT_LAYOUT', 'flat').lower()
+    URL_PREFLIGHT = os.getenv('URL_PREFLIGHT', 'true').lower() == 'true'
+    URL_PREFLIGHT_CONCURRENCY = int(os.getenv('URL_PREFLIGHT_CONCURRENCY', '16'))
+    URL_PREFLIGHT_TIMEOUT = float(os.getenv('URL_PREFLIGHT_TIMEOUT', '10'))
+    URL_PREFLIGHT_TTL_HOURS = float(os.getenv('URL_PREFLIGHT_TTL_HOURS', '24'))
+    URL_MAX_MB = float(os.getenv('URL_MAX_MB', '20'))
+    CASCADE_ENABLED = os.getenv('CASCADE_ENABLED', 'false').lower() == 'true'
+    CASCADE_CHEAP_MODEL = os.getenv('CASCADE_CHEAP_MODEL', 'gpt-4o-mini')
+    CASCADE_CHEAP_RESOLUTION = int(os.getenv('CASCADE_CHEAP_RESOLUTION', '512'))
+    CASCADE_CHEAP_DETAIL = os.getenv('CASCADE_CHEAP_DETAIL', 'low').lower()
+    CASCADE_STRONG_MODEL = os.getenv('CASCADE_STRONG_MODEL', 'gpt-4o')
+    CASCADE_STRONG_RESOLUTION = int(os.getenv('CASCADE_STRONG_RESOLUTION', '0'))
+    CASCADE_STRONG_DETAIL = os.getenv('CASCADE_STRONG_DETAIL', '').lower()
+    CASCADE_MIN_WORDS = int(os.getenv('CASCADE_MIN_WORDS', '8'))
+    CASCADE_REQUIRED_KEYWORDS = os.getenv('CASCADE_REQUIRED_KEYWORDS', '')
+    QUOTA_LEDGER = os.getenv('QUOTA_LEDGER', 'true').lower() == 'true'
 
 # Progress tracking functions
 def update_progress():
     """Update both GUI progress bar and status label."""
     global processed_images, total_images
+    if root is None:
+        return
     if total_images > 0:
         progress = (processed_images / total_images) * 100
         progress_var.set(progress)
         status_label.config(text=strings.get('ui.status.progress',
             current=processed_images,
             total=total_images,
-            percent=progress
+            percent=progress,
+            concurrency=concurrency_controller.current
         ))
     root.update_idletasks()
 
@@ -80,7 +303,48 @@ def increment_progress():
     processed_images += 1
     update_progress()
 
+def get_dashboard(estimated_cost=None, tpm_limit=0):
+    """Collect the live statistics of the current run."""
+    dashboard = run_stats.snapshot()
+    spend = total_input_cost + total_output_cost
+    if run_control.is_cancelled():
+        state = 'cancelling'
+    elif run_control.is_paused():
+        state = 'paused'
+    else:
+        state = 'running'
+    dashboard.update({
+        'updated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'state': state,
+        'concurrency': concurrency_controller.current,
+        'hedges': hedge_policy.hedges,
+        'tpm_limit': tpm_limit,
+        'tpm_utilization': round(dashboard['tokens_per_minute'] / tpm_limit, 3) if tpm_limit else None,
+        'spend': round(spend, 4),
+        'estimated_cost': round(estimated_cost, 4) if estimated_cost is not None else None,
+        'spend_cap': MAX_RUN_COST or None,
+        'token_cap': MAX_RUN_TOKENS or None,
+        'budget_reached': spend_governor.refused,
+    })
+    return dashboard
+
+def update_dashboard(dashboard):
+    """Show the live statistics below the progress bar."""
+    if root is None:
+        return
+    dashboard_label.config(text=strings.get('ui.status.dashboard',
+        images_per_second="{:.2f}".format(dashboard['images_per_second']),
+        tokens_per_minute=dashboard['tokens_per_minute'],
+        tpm_percent="{:.0f}".format((dashboard['tpm_utilization'] or 0) * 100),
+        eta=format_duration(dashboard['eta_seconds']),
+        spend="{:.4f}".format(dashboard['spend']),
+        estimate="{:.4f}".format(dashboard['estimated_cost'] or 0),
+        error_percent="{:.0f}".format(dashboard['error_rate'] * 100)
+    ))
+
 def update_status(message):
+    if root is None:
+        return
     status_label.config(text=message)
     root.update_idletasks()
 
@@ -138,24 +402,58 @@ def load_prompts():
             with open(presets_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
                 if isinstance(data, dict) and 'presets' in data:
-                    prompts = [(p['title'], p['text']) for p in data['presets'] 
+                    prompts = [p for p in data['presets'] 
                               if 'title' in p and 'text' in p]
         
         if not prompts:
             print(strings.get('messages.console.presets.warning'))
             # Add a default preset
-            prompts = [("Basic Description", "What's in this image?")]
+            prompts = [{"title": "Basic Description", "text": "What's in this image?"}]
     except Exception as e:
         print(strings.get('messages.errors.load_presets', error=str(e)))
         # Add a default preset
-        prompts = [("Basic Description", "What's in this image?")]
+        prompts = [{"title": "Basic Description", "text": "What's in this image?"}]
     
     return prompts
 
+def get_preset_setting(instruction_text, key, default=None):
+    """Return a setting of the preset whose text matches the prompt, or the default."""
+    for preset in prompts:
+        if preset['text'].strip() == instruction_text.strip() and key in preset:
+            return preset[key]
+    return default
+
+def get_output_budgets():
+    """Load the caption lengths of earlier runs once per session."""
+    global output_budgets
+    if output_budgets is None:
+        output_budgets = OutputBudgets(
+            os.path.join(CACHE_DIR, 'output_budgets.json'),
+            default=MAX_COMPLETION_TOKENS,
+            maximum=max(MAX_ADAPTIVE_TOKENS, MAX_COMPLETION_TOKENS)
+        )
+    return output_budgets
+
+def get_max_tokens(instruction_text):
+    """Return the max_tokens for a prompt: the preset's own, the learned one or the default."""
+    max_tokens = get_preset_setting(instruction_text, 'max_tokens')
+    if max_tokens:
+        return int(max_tokens)
+    if ADAPTIVE_MAX_TOKENS:
+        return get_output_budgets().budget_for(hash_prompt(instruction_text))
+    return MAX_COMPLETION_TOKENS
+
+def get_image_detail(instruction_text):
+    """Return the image detail level (low, high or auto) for a prompt."""
+    detail = str(get_preset_setting(instruction_text, 'detail', IMAGE_DETAIL)).lower()
+    return detail if detail in ('low', 'high', 'auto') else 'auto'
+
 def save_settings():
     """Save current settings to .env file."""
+    from dotenv import set_key
     env_path = os.path.join(SCRIPT_DIR, '.env')
     set_key(env_path, 'BATCH_PROCESSING_ENABLED', str(batch_var.get()).lower())
+    set_key(env_path, 'STREAMING_ENABLED', str(stream_var.get()).lower())
     set_key(env_path, 'SAVE_INDIVIDUAL_ENABLED', str(save_individual_var.get()).lower())
     set_key(env_path, 'SAVE_LOCAL_IN_PLACE', str(save_local_var.get()).lower())
     set_key(env_path, 'OVERWRITE_FILES', str(overwrite_var.get()).lower())
@@ -168,6 +466,9 @@ def load_settings():
     batch_enabled = os.getenv('BATCH_PROCESSING_ENABLED', 'false').lower() == 'true'
     batch_var.set(batch_enabled)
     
+    stream_enabled = os.getenv('STREAMING_ENABLED', 'false').lower() == 'true'
+    stream_var.set(stream_enabled)
+    
     save_individual_enabled = os.getenv('SAVE_INDIVIDUAL_ENABLED', 'true').lower() == 'true'
     save_individual_var.set(save_individual_enabled)
     
@@ -220,111 +521,683 @@ def get_rate_limits():
     
     return current_tier, tiers
 
+def get_api_keys():
+    """
+    Collect the API keys of the pool: OPENAI_API_KEY at CURRENT_TIER, and
+    OPENAI_API_KEY_1, OPENAI_API_KEY_2, ... each at its OPENAI_API_KEY_<n>_TIER
+    (CURRENT_TIER if not set). Each key gets the limits of its tier.
+    """
+    current_tier, tiers = get_rate_limits()
+    entries = [('OPENAI_API_KEY', get_credentials(), current_tier)]
+    number = 1
+    while os.getenv(f'OPENAI_API_KEY_{number}'):
+        entries.append((
+            f'OPENAI_API_KEY_{number}',
+            os.getenv(f'OPENAI_API_KEY_{number}'),
+            os.getenv(f'OPENAI_API_KEY_{number}_TIER', current_tier)
+        ))
+        number += 1
+    
+    keys = []
+    seen = set()
+    for name, api_key, tier in entries:
+        if (not api_key and keys) or api_key in seen:
+            continue
+        seen.add(api_key)
+        limits = tiers.get(tier, tiers.get(current_tier, {'rpm': 0, 'tpm': 0}))
+        keys.append(ApiKey(name, api_key, tier, limits['rpm'], limits['tpm'], limits.get('rpd', 0)))
+    # Without OPENAI_API_KEY, the pool is made of the numbered keys only
+    if len(keys) > 1 and not keys[0].api_key:
+        keys.pop(0)
+    return keys
+
+def get_quota_ledger():
+    """Open the ledger of daily usage per key once per session, or None if it is disabled."""
+    global quota_ledger
+    if quota_ledger is None and QUOTA_LEDGER:
+        quota_ledger = QuotaLedger(os.path.join(CACHE_DIR, 'quota_ledger.sqlite3'))
+    return quota_ledger
+
+def get_payload_cache():
+    """Load the cache of encoded images once per session, or None if it is disabled."""
+    global payload_cache
+    if payload_cache is None and PAYLOAD_CACHE_MB > 0:
+        payload_cache = PayloadCache(os.path.join(CACHE_DIR, 'payloads'), int(PAYLOAD_CACHE_MB * 1024 * 1024))
+    return payload_cache
+
+def get_payload_cache_key(source, detail, resolution=None):
+    """The payload cache key of a local image or archive member, or None if it cannot be cached."""
+    if get_payload_cache() is None or isinstance(source, VideoFrame) or is_url(source):
+        return None
+    try:
+        stat_result = get_input_stat(source)
+    except OSError:
+        return None
+    target_size = resolution or int(resolution_var.get())
+    return PayloadCache.make_key(source, stat_result, target_size, detail, RESIZE_POLICY, TILE_SNAP_TOLERANCE)
+
+def get_daily_requests_left(keys):
+    """The requests the keys may still send today, or None if a key has no daily limit."""
+    ledger = get_quota_ledger()
+    if ledger is None or not keys or any(key.rpd <= 0 for key in keys):
+        return None
+    return sum(max(0, key.rpd - ledger.usage_today(key.key_id).requests) for key in keys)
+
 # Function to configure and get the OpenAI client
-def get_openai_client():
-    api_key = get_credentials()
-    client = OpenAI(api_key=api_key)
-    return client
+def get_openai_client(api_key=None):
+    with openai_clients_lock:
+        if api_key not in openai_clients:
+            from openai import OpenAI
+            openai_clients[api_key] = OpenAI(api_key=api_key or get_credentials())
+        return openai_clients[api_key]
 
 # Function to read plain URLs from text area
 def extract_image_urls(raw_text):
     urls = [line.strip() for line in raw_text.splitlines() if line.strip()]
     return urls
 
-def encode_image_file(image_path):
-    """Process and encode an image file to base64, with resizing if needed."""
+def count_image_tiles(width, height):
+    """Count the 512px tiles the API bills for an image sent at high detail."""
+    scale = min(1.0, IMAGE_MAX_SIDE / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, IMAGE_SHORT_SIDE / min(width, height))
+    width, height = int(width * scale), int(height * scale)
+    return math.ceil(width / IMAGE_TILE_SIZE) * math.ceil(height / IMAGE_TILE_SIZE)
+
+def calculate_image_tokens(width, height, detail='auto'):
+    """Calculate the input tokens billed for an image of the given size."""
+    if detail == 'low':
+        return IMAGE_TOKENS_BASE
+    return IMAGE_TOKENS_BASE + IMAGE_TOKENS_PER_TILE * count_image_tiles(width, height)
+
+def get_longest_edge_size(width, height, target_size):
+    """Scale a size down so the longest edge fits the target resolution."""
+    longest_edge = max(width, height)
+    if longest_edge <= target_size:
+        return width, height
+    scale_factor = target_size / longest_edge
+    return max(1, int(width * scale_factor)), max(1, int(height * scale_factor))
+
+def get_target_size(width, height, target_size, detail='auto'):
+    """
+    Calculate the size to send an image at. With the tile policy, images that are
+    just past a tile boundary are shrunk slightly so they use the fewest tiles.
+    """
+    if detail == 'low':
+        # Low detail images are billed at a flat rate and viewed at 512px
+        return get_longest_edge_size(width, height, min(target_size, IMAGE_TILE_SIZE))
+
+    width, height = get_longest_edge_size(width, height, target_size)
+    if RESIZE_POLICY != 'tile' or TILE_SNAP_TOLERANCE <= 0:
+        return width, height
+
+    def scaled(factor):
+        return max(1, int(width * factor)), max(1, int(height * factor))
+
+    # Find the fewest tiles reachable within the tolerance; tiles never grow as the image shrinks
+    best_tiles = count_image_tiles(*scaled(1 - TILE_SNAP_TOLERANCE))
+    if best_tiles == count_image_tiles(width, height):
+        return width, height
+
+    # Binary search the largest scale that still reaches that tile count
+    low, high = 1 - TILE_SNAP_TOLERANCE, 1.0
+    for _ in range(20):
+        mid = (low + high) / 2
+        if count_image_tiles(*scaled(mid)) <= best_tiles:
+            low = mid
+        else:
+            high = mid
+    return scaled(low)
+
+def encode_file_bytes(file_path):
+    """Base64 encode a file through a memory map, without copying it into a bytes object first."""
+    import mmap
+    with open(file_path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return base64.b64encode(data).decode('ascii')
+
+def encode_image_file(image_path, detail='auto', data=None, resolution=None, cache_key=None):
+    """
+    Process and encode an image file to base64, with resizing if needed. When
+    data is given, it holds the encoded image instead of the file. The image
+    fits the given resolution, or the Max Resolution setting. Re-encoded images
+    are stored in the payload cache under cache_key.
+    Returns the encoded image with its original size and the size that was sent.
+    """
+    from PIL import Image
     try:
-        with Image.open(image_path) as img:
+        with Image.open(io.BytesIO(data) if data is not None else image_path) as img:
+            original_size = img.size
+            target_size = resolution or int(resolution_var.get())
+            new_size = get_target_size(img.width, img.height, target_size, detail)
+
+            # JPEGs that already have the target size are sent as they are, without decoding them
+            if img.format == 'JPEG' and img.mode in ('RGB', 'L') and new_size == img.size:
+                if data is not None:
+                    return base64.b64encode(data).decode('ascii'), original_size, new_size
+                return encode_file_bytes(image_path), original_size, new_size
+
             # Convert to RGB if needed
             if img.mode in ('RGBA', 'P'):
                 img = img.convert('RGB')
             
-            # Get target resolution
-            target_size = int(resolution_var.get())
-            
-            # Calculate scaling based on longest edge
-            longest_edge = max(img.width, img.height)
-            if longest_edge > target_size:
-                scale_factor = target_size / longest_edge
-                new_size = (
-                    int(img.width * scale_factor),
-                    int(img.height * scale_factor)
-                )
+            # Resize to the target resolution
+            if new_size != img.size:
                 img = img.resize(new_size, Image.LANCZOS)
             
             # Convert to bytes
             buffer = io.BytesIO()
             img.save(buffer, format='JPEG', quality=95)
-            return base64.b64encode(buffer.getvalue()).decode('utf-8')
+            if cache_key:
+                get_payload_cache().put(cache_key, buffer.getvalue(), original_size, new_size)
+            return base64.b64encode(buffer.getvalue()).decode('utf-8'), original_size, new_size
     except Exception as e:
         raise ValueError(strings.get('messages.errors.image_processing.failed_to_process', error=str(e)))
 
+def get_image_token_saving(original_size, sent_size, detail):
+    """Tokens saved compared to sending the image resized by longest edge only, at high detail."""
+    baseline_size = get_longest_edge_size(original_size[0], original_size[1], int(resolution_var.get()))
+    return calculate_image_tokens(*baseline_size) - calculate_image_tokens(*sent_size, detail=detail)
+
+def estimate_image_token_saving(image_urls, instruction_text, sample_limit=200):
+    """
+    Estimate the image tokens saved on local files by the resize policy and detail
+    level. Only image headers are read, and large selections are sampled.
+    """
+    from PIL import Image
+    detail = get_image_detail(instruction_text)
+    target_size = int(resolution_var.get())
+    local_files = [path for path in image_urls if not is_url(path) and not is_video(path)]
+    sample = archive_reader.in_stored_order(local_files[:sample_limit])
+
+    saved = 0
+    for image_path in sample:
+        try:
+            source = io.BytesIO(archive_reader.read(image_path)) if is_archive_member(image_path) else image_path
+            with Image.open(source) as img:
+                original_size = img.size
+        except Exception:
+            continue
+        sent_size = get_target_size(original_size[0], original_size[1], target_size, detail)
+        saved += get_image_token_saving(original_size, sent_size, detail)
+    if sample:
+        saved = saved * len(local_files) / len(sample)
+    return int(saved)
+
+def estimate_payload_bytes(source, resolution=None):
+    """Estimate the base64 payload size of an image, video frame or URL before encoding it."""
+    if isinstance(source, VideoFrame):
+        return len(source.data) * 4 // 3
+    if is_url(source):
+        return 0
+    image_path = source
+    target_size = resolution or int(resolution_var.get())
+    try:
+        file_size = os.path.getsize(image_path)
+    except OSError:
+        file_size = 0
+    # A resized JPEG at quality 95 rarely exceeds one byte per pixel
+    upper_bound = target_size * target_size
+    return (min(file_size, upper_bound) or upper_bound) * 4 // 3
+
+def get_peak_rss():
+    """Return the peak resident set size of this process in bytes, or None if unknown."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS reports bytes
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        pass
+
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ('cb', wintypes.DWORD),
+                ('PageFaultCount', wintypes.DWORD),
+                ('PeakWorkingSetSize', ctypes.c_size_t),
+                ('WorkingSetSize', ctypes.c_size_t),
+                ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                ('PagefileUsage', ctypes.c_size_t),
+                ('PeakPagefileUsage', ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    except (AttributeError, OSError):
+        pass
+    return None
+
 def is_url(path):
     """Check if the path is a URL."""
     return path.startswith(('http://', 'https://', 'ftp://'))
 
-def analyze_image(image_url, instruction_text, status_callback=None):
-    # Global declarations
-    global consecutive_errors, failed_files, total_prompt_tokens, total_completion_tokens, total_tokens
+# Result of a chat completion request
+Completion = namedtuple('Completion', ['text', 'usage', 'finish_reason', 'time_to_first_token'])
+
+def get_token_costs(model):
+    """Return the (input, output) cost per token of a model."""
+    return MODEL_TOKEN_COSTS.get(model, (TOKEN_COST_INPUT, TOKEN_COST_OUTPUT))
+
+def record_usage(prompt_tokens, completion_tokens, model=MODEL, key=None):
+    """Add the tokens of one request to the run totals and to the key's daily usage, and return its cost."""
+    global total_prompt_tokens, total_completion_tokens, total_tokens, total_input_cost, total_output_cost
+    input_token_cost, output_token_cost = get_token_costs(model)
+    input_cost = prompt_tokens * input_token_cost
+    output_cost = completion_tokens * output_token_cost
+    with usage_lock:
+        total_prompt_tokens += prompt_tokens
+        total_completion_tokens += completion_tokens
+        total_tokens += prompt_tokens + completion_tokens
+        total_input_cost += input_cost
+        total_output_cost += output_cost
+    run_stats.record_tokens(prompt_tokens + completion_tokens)
+    spend_governor.record_usage(prompt_tokens, completion_tokens, input_cost + output_cost)
+    if key is not None and key_pool.ledger is not None:
+        key_pool.ledger.add(key.key_id, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                            cost=input_cost + output_cost)
+    return input_cost + output_cost
+
+def estimate_prompt_tokens(instruction_text, sent_sizes=(None,), detail='auto'):
+    """Estimate the input tokens of a request whose usage was not reported."""
+    image_tokens = sum(
+        calculate_image_tokens(*sent_size, detail=detail) if sent_size else IMAGE_TOKENS_BASE
+        for sent_size in sent_sizes
+    )
+    return image_tokens + len(instruction_text) // 4
+
+def record_response_headers(key, headers):
+    """Feed the rate limit headers of a response to the concurrency controller and the key pool."""
+    concurrency_controller.record_headers(headers)
+    key_pool.record_headers(key, headers)
+
+def is_quota_error(error):
+    """Whether an API error means the key is out of quota, not just rate limited."""
+    return getattr(error, 'code', None) == 'insufficient_quota' or 'insufficient_quota' in str(error)
+
+def request_completion(key, request):
+    """Send a request with an API key of the pool and wait for the complete response."""
+    client = get_openai_client(key.api_key)
+    raw_response = client.chat.completions.with_raw_response.create(**request)
+    record_response_headers(key, raw_response.headers)
+    response = raw_response.parse()
+    choice = response.choices[0]
+    return Completion(choice.message.content or '', response.usage, choice.finish_reason, None)
+
+def continue_completion(request, completion, estimated_prompt_tokens):
+    """
+    Ask the model to finish a caption that was cut off at max_tokens and join the
+    two parts. The continuation is a request of its own, sent within the key
+    limits and the spend cap; the caption stays cut off if the cap leaves no room.
+    """
+    if completion.usage:
+        prompt_tokens = completion.usage.prompt_tokens + completion.usage.completion_tokens
+    else:
+        prompt_tokens = estimated_prompt_tokens + len(completion.text) // 4
+    reservation = spend_governor.reserve(prompt_tokens, request['max_tokens'])
+    if reservation is None:
+        return completion
+    try:
+        continuation, _ = send_request(dict(request, messages=request['messages'] + [
+            {"role": "assistant", "content": completion.text},
+            {"role": "user", "content": strings.get('messages.processing.continue_prompt')}
+        ]), prompt_tokens + request['max_tokens'])
+    finally:
+        spend_governor.release(reservation, completed=False)
+    usage = None
+    if completion.usage and continuation.usage:
+        usage = SimpleNamespace(
+            prompt_tokens=completion.usage.prompt_tokens + continuation.usage.prompt_tokens,
+            completion_tokens=completion.usage.completion_tokens + continuation.usage.completion_tokens
+        )
+    # The cut may fall inside a word, so the parts are joined as they are
+    return Completion(
+        completion.text + continuation.text,
+        usage,
+        continuation.finish_reason,
+        completion.time_to_first_token
+    )
+
+def stream_completion(key, request, image_url, request_start, status_callback=None):
+    """
+    Stream a response, showing the partial caption as it arrives. The stream is
+    cancelled as soon as its first tokens match one of the refusal patterns, and
+    the refusal is returned without usage, like a refusal that was not streamed.
+    """
+    global refusals_cancelled
+    client = get_openai_client(key.api_key)
+    raw_response = client.chat.completions.with_raw_response.create(
+        stream=True,
+        stream_options={"include_usage": True},
+        **request
+    )
+    record_response_headers(key, raw_response.headers)
+    stream = raw_response.parse()
     
+    error_patterns = strings.get('messages.errors.responses.patterns')
+    parts = []
+    usage = None
+    finish_reason = None
+    first_token_time = None
+    may_be_refusal = True
+    last_update = 0
     try:
-        client = get_openai_client()
-        if status_callback:
-            status_callback(strings.get('messages.processing.status.processing', file=image_url))
+        for chunk in stream:
+            if chunk.usage:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            finish_reason = choice.finish_reason or finish_reason
+            if not choice.delta.content:
+                continue
             
-        # Prepare the image content based on whether it's a URL or local file
-        if is_url(image_url):
-            image_content = {
-                "type": "image_url",
-                "image_url": {"url": image_url}
-            }
-        else:
-            # For local files, use base64 encoding
-            base64_image = encode_image_file(image_url)
-            image_content = {
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/jpeg;base64,{base64_image}"
-                }
-            }
+            if first_token_time is None:
+                first_token_time = time.monotonic() - request_start
+                time_to_first_token.append(first_token_time)
+            parts.append(choice.delta.content)
+            
+            # Check the start of the caption until it can no longer match a refusal
+            if may_be_refusal:
+                text = ''.join(parts).lstrip()
+                if any(text.startswith(err) for err in error_patterns):
+                    with usage_lock:
+                        refusals_cancelled += 1
+                    return Completion(text, None, 'refusal', first_token_time)
+                may_be_refusal = any(err.startswith(text) for err in error_patterns)
+            
+            # Show the partial caption a few times per second
+            now = time.monotonic()
+            if status_callback and now - last_update > 0.25:
+                last_update = now
+                status_callback(strings.get('messages.processing.status.partial',
+                    file=image_url,
+                    caption=''.join(parts)[-100:].replace('\n', ' ')
+                ))
+    finally:
+        stream.close()
+    
+    return Completion(''.join(parts), usage, finish_reason, first_token_time)
+
+def build_image_content(source, detail, resolution=None):
+    """
+    Build the image part of a request from a URL, a local image file or a sampled
+    video frame. Local images are encoded at the given resolution or the Max
+    Resolution setting; the caller holds their payload budget.
+    Returns the content, the size the image is sent at (None for URLs) and the
+    payload size in bytes.
+    """
+    global total_image_tokens_saved
+    if isinstance(source, str) and is_url(source):
+        return {"type": "image_url", "image_url": {"url": source, "detail": detail}}, None, 0
+    
+    # Images encoded with the same settings in an earlier run are read back from the payload cache
+    cache_key = get_payload_cache_key(source, detail, resolution)
+    cached = get_payload_cache().get(cache_key) if cache_key else None
+    if cached:
+        base64_image, original_size, sent_size = base64.b64encode(cached[0]).decode('ascii'), cached[1], cached[2]
+    elif isinstance(source, VideoFrame):
+        base64_image, original_size, sent_size = encode_image_file(None, detail, source.data, resolution)
+    elif is_archive_member(source):
+        # Archive members are read into memory, never extracted to disk
+        base64_image, original_size, sent_size = encode_image_file(
+            None, detail, archive_reader.read(source), resolution, cache_key)
+    else:
+        base64_image, original_size, sent_size = encode_image_file(source, detail, None, resolution, cache_key)
+    
+    image_content = {
+        "type": "image_url",
+        "image_url": {
+            "url": f"data:image/jpeg;base64,{base64_image}",
+            "detail": detail
+        }
+    }
+    base64_image = None
+    with usage_lock:
+        total_image_tokens_saved += get_image_token_saving(original_size, sent_size, detail)
+    return image_content, sent_size, len(image_content["image_url"]["url"])
+
+def send_request(request, reserved_tokens, image_url=None, status_callback=None, stream=False):
+    """
+    Send a request with the API key with the most headroom, moving to another
+    key if its key fails authentication, is out of quota or is rate limited.
+    Returns the completion and the key that answered.
+    """
+    for attempt in range(len(key_pool.keys)):
+        try:
+            key = key_pool.acquire(reserved_tokens)
+        except PoolExhausted:
+            raise ValueError(strings.get('messages.errors.keys_exhausted'))
+        used_tokens = 0
+        try:
+            request_start = time.monotonic()
+            if stream:
+                completion = stream_completion(
+                    key,
+                    request,
+                    image_url,
+                    request_start,
+                    status_callback
+                )
+            else:
+                completion = request_completion(key, request)
+            concurrency_controller.record_success(time.monotonic() - request_start)
+            used_tokens = completion.usage.total_tokens if completion.usage else reserved_tokens
+            return completion, key
+        except Exception as e:
+            status_code = getattr(e, 'status_code', None)
+            quota_error = is_quota_error(e)
+            concurrency_controller.record_error(rate_limited=status_code == 429 and not quota_error)
+            if status_code in (401, 403) or quota_error:
+                if key_pool.quarantine(key, permanent=True):
+                    print(strings.get('messages.errors.key_quarantined', key=key.name, error=str(e)))
+            elif status_code == 429:
+                retry_after = getattr(getattr(e, 'response', None), 'headers', {}).get('retry-after')
+                try:
+                    key_pool.quarantine(key, seconds=float(retry_after) if retry_after else None)
+                except ValueError:
+                    key_pool.quarantine(key)
+            else:
+                raise
+            # Try the next key, unless every key was tried
+            if attempt + 1 == len(key_pool.keys):
+                raise
+        finally:
+            key_pool.release(key, reserved_tokens, used_tokens)
+
+def caption_images(sources, instruction_text, image_url, status_callback=None, stream=False, stage=None):
+    """
+    Send the instruction with one or more images in a single request and return
+    the caption. A caption cut off at max_tokens is continued if enabled.
+    A cascade stage sets the model, resolution and detail level of the request.
+    Raises CaptionRefused when the model declines.
+    """
+    global captions_requested, truncated_captions, continued_captions
+    detail = stage.detail if stage and stage.detail in ('low', 'high', 'auto') else get_image_detail(instruction_text)
+    resolution = stage.resolution if stage else None
+    image_contents = []
+    sent_sizes = []
+    stage_start = time.monotonic()
+    # Encode just before sending, within the payload memory budget. The whole request is reserved at
+    # once, so requests with many frames never hold part of the budget while waiting for the rest.
+    reserved_bytes = payload_budget.acquire(sum(estimate_payload_bytes(source, resolution) for source in sources))
+    try:
+        payload_bytes = 0
+        for source in sources:
+            image_content, sent_size, image_bytes = build_image_content(source, detail, resolution)
+            image_contents.append(image_content)
+            sent_sizes.append(sent_size)
+            payload_bytes += image_bytes
+        payload_budget.adjust(payload_bytes - reserved_bytes)
+        reserved_bytes = payload_bytes
         
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
+        request = {
+            "model": stage.model if stage else MODEL,
+            "messages": [
                 {
                     "role": "user",
-                    "content": [
-                        {"type": "text", "text": instruction_text},
-                        image_content
-                    ],
+                    "content": [{"type": "text", "text": instruction_text}] + image_contents,
                 }
             ],
-            max_tokens=300,
-        )
+            "max_tokens": get_max_tokens(instruction_text),
+        }
+        estimated_prompt_tokens = estimate_prompt_tokens(instruction_text, sent_sizes, detail)
+        completion, key = send_request(
+            request, estimated_prompt_tokens + request["max_tokens"], image_url, status_callback, stream)
+        truncated = completion.finish_reason == 'length'
+        continued = False
+        if truncated and CONTINUE_TRUNCATED:
+            continuation = continue_completion(request, completion, estimated_prompt_tokens)
+            continued = continuation is not completion
+            completion = continuation
+    finally:
+        # Release the payloads as soon as the request is done
+        request = image_contents = None
+        payload_budget.release(reserved_bytes)
+
+    description = completion.text.strip()
+    model = stage.model if stage else MODEL
     
-        description = response.choices[0].message.content.strip()
-        
-        # Update token counts
-        usage = response.usage
-        total_prompt_tokens += usage.prompt_tokens
-        total_completion_tokens += usage.completion_tokens
-        total_tokens += usage.total_tokens
-        
-        # Check for error responses
-        error_patterns = strings.get('messages.errors.responses.patterns')
-        if any(description.startswith(err) for err in error_patterns):
-            error_msg = strings.get('messages.errors.api_error', message=description)
-            print(strings.get('messages.errors.processing_error', file=image_url, error=error_msg))
-            raise ValueError(error_msg)
-        
-        if status_callback:
+    # Update token counts
+    if completion.usage:
+        cost = record_usage(completion.usage.prompt_tokens, completion.usage.completion_tokens, model, key)
+    else:
+        cost = record_usage(
+            estimate_prompt_tokens(instruction_text, sent_sizes, detail), len(description) // 4, model, key)
+    if stage:
+        cascade_stats.record_request(stage.name, cost, time.monotonic() - stage_start)
+    
+    # Check for error responses, which are reported by the caller
+    error_patterns = strings.get('messages.errors.responses.patterns')
+    if any(description.startswith(err) for err in error_patterns):
+        raise CaptionRefused(strings.get('messages.errors.api_error', message=description))
+    
+    # Learn the caption length of the prompt
+    with usage_lock:
+        captions_requested += 1
+        truncated_captions += truncated
+        continued_captions += continued
+    get_output_budgets().record(
+        hash_prompt(instruction_text),
+        completion.usage.completion_tokens if completion.usage else len(description) // 4,
+        truncated=completion.finish_reason == 'length'
+    )
+    
+    if status_callback:
+        if completion.time_to_first_token is not None:
+            status_callback(strings.get('messages.processing.status.completed_streamed',
+                file=image_url,
+                ttft="{:.2f}".format(completion.time_to_first_token)
+            ))
+        else:
             status_callback(strings.get('messages.processing.status.completed', file=image_url))
+    
+    return description
+
+def get_cascade_stages():
+    """Return the cheap and the strong stage of the cascade."""
+    return (
+        CascadeStage('cheap', CASCADE_CHEAP_MODEL, CASCADE_CHEAP_RESOLUTION, CASCADE_CHEAP_DETAIL),
+        CascadeStage('strong', CASCADE_STRONG_MODEL, CASCADE_STRONG_RESOLUTION, CASCADE_STRONG_DETAIL)
+    )
+
+def get_cascade_checks(instruction_text):
+    """Return the minimum word count and the required keywords of a prompt; presets can set their own."""
+    min_words = int(get_preset_setting(instruction_text, 'cascade_min_words', CASCADE_MIN_WORDS))
+    keywords = get_preset_setting(instruction_text, 'cascade_keywords', CASCADE_REQUIRED_KEYWORDS)
+    if isinstance(keywords, str):
+        keywords = keywords.split(',')
+    return min_words, [keyword.strip() for keyword in keywords if keyword.strip()]
+
+def caption_input(sources, instruction_text, image_url, status_callback=None, stream=False):
+    """
+    Caption one input. In cascade mode the cheap stage goes first, and the input
+    is sent to the strong stage only when the cheap caption is a refusal, is too
+    short or misses a required keyword.
+    """
+    if not CASCADE_ENABLED:
+        return caption_images(sources, instruction_text, image_url, status_callback, stream)
+    
+    cheap, strong = get_cascade_stages()
+    try:
+        description = caption_images(sources, instruction_text, image_url, status_callback, stream, cheap)
+        reason = check_caption(description, *get_cascade_checks(instruction_text))
+    except CaptionRefused:
+        reason = 'refusal'
+    cascade_stats.record_input(reason)
+    if reason is None:
+        return description
+    
+    if status_callback:
+        status_callback(strings.get('messages.processing.status.escalated', file=image_url, reason=reason))
+    return caption_images(sources, instruction_text, image_url, status_callback, stream, strong)
+
+def is_video_input(image_url):
+    return not is_url(image_url) and not is_archive_member(image_url) and is_video(image_url)
+
+def get_video_frames(video_path):
+    """Sample the frames of a video in a worker process, so decoding overlaps with API calls."""
+    global video_pool
+    if not video_support_available():
+        raise ValueError(strings.get('messages.errors.video.opencv_missing'))
+    with video_pool_lock:
+        if video_pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            video_pool = ProcessPoolExecutor(max_workers=VIDEO_DECODE_WORKERS)
+    return video_pool.submit(
+        sample_frames,
+        video_path,
+        VIDEO_SAMPLING,
+        VIDEO_FRAME_INTERVAL,
+        VIDEO_SCENE_THRESHOLD,
+        VIDEO_MAX_FRAMES,
+        IMAGE_MAX_SIDE
+    ).result()
+
+def analyze_image(image_url, instruction_text, status_callback=None, stream=False):
+    """
+    Caption an image or a video. Videos are captioned from their sampled frames,
+    either with one caption for the clip or with a list of (timestamp, caption)
+    pairs, one per frame.
+    """
+    # Global declarations
+    global consecutive_errors, failed_files
+    
+    try:
+        # Wait here while the run is paused, and stop if it was cancelled
+        run_control.checkpoint()
+        if status_callback:
+            status_callback(strings.get('messages.processing.status.processing', file=image_url))
+        
+        if is_video_input(image_url):
+            frames = get_video_frames(image_url)
+            if VIDEO_CAPTION_MODE == 'frame':
+                description = [
+                    (frame.timestamp, caption_input([frame], instruction_text, image_url, status_callback, stream))
+                    for frame in frames
+                ]
+            else:
+                description = caption_input(frames, instruction_text, image_url, status_callback, stream)
+        else:
+            description = caption_input([image_url], instruction_text, image_url, status_callback, stream)
             
         # Reset consecutive errors on success
         consecutive_errors = 0
         
         return description
         
+    except RunCancelled:
+        raise
+        
     except Exception as e:
         error_msg = str(e)
         print(strings.get('messages.errors.processing_error', file=image_url, error=error_msg))
@@ -342,8 +1215,52 @@ def analyze_image(image_url, instruction_text, status_callback=None):
             
         return None
 
-def write_to_file(description, filename, folder_path, original_path=None):
-    """Write caption to file, either in the dated folder or next to the original file."""
+def get_output_index():
+    """Load the index of previously captioned inputs once per session."""
+    global output_index
+    if output_index is None:
+        output_index = OutputIndex(os.path.join(CACHE_DIR, 'output_index.jsonl'))
+    return output_index
+
+def get_input_stat(image_path):
+    """Stat a local file or archive member. Raises OSError if it does not exist."""
+    if is_archive_member(image_path):
+        return archive_reader.stat(image_path)
+    return os.stat(image_path)
+
+def get_output_index_key(image_url, instruction_text, stat_result=None):
+    """Build the output index key for an input, reading its stat result if needed."""
+    if is_url(image_url):
+        return OutputIndex.make_key(image_url, instruction_text)
+    if stat_result is None:
+        stat_result = get_input_stat(image_url)
+    return OutputIndex.make_key(image_url, instruction_text, stat_result)
+
+def write_archive_caption(description, filename, member_path):
+    """
+    Write the caption of an archive member next to the archive, in a sibling
+    directory or a new zip archive that mirrors the folders inside the archive.
+    Returns the path of the caption.
+    """
+    archive_path, member = split_member(member_path)
+    # Keep member names from pointing outside the output
+    folders = [part for part in posixpath.dirname(member).split('/') if part not in ('', '.', '..')]
+    if ARCHIVE_OUTPUT == 'zip':
+        name = '/'.join(folders + [f'{filename}.txt'])
+        return caption_archives.write(archive_stem(archive_path) + '_captions.zip', name, description)
+    
+    file_dir = os.path.join(archive_stem(archive_path) + '_captions', *folders)
+    os.makedirs(file_dir, exist_ok=True)
+    file_path = os.path.join(file_dir, f'{filename}.txt')
+    write_text_atomic(file_path, description)
+    return file_path
+
+def write_to_file(description, filename, folder_path, original_path=None, source=None):
+    """
+    Write caption to file, either in the dated folder or next to the original file.
+    Source is the input the caption belongs to, which places the file in the
+    output layout. Returns the path of the file that was written.
+    """
     if not save_individual_var.get():
         # When individual captions are disabled, append to a consolidated file
         consolidated_path = os.path.join(folder_path, 'captions.txt')
@@ -351,124 +1268,343 @@ def write_to_file(description, filename, folder_path, original_path=None):
             os.makedirs(folder_path)
         with open(consolidated_path, 'a', encoding='utf-8') as file:
             file.write(f"=== {filename} ===\n{description}\n\n")
-        return
+        return consolidated_path
 
     # Individual caption files
-    if original_path and save_local_var.get() and os.path.exists(original_path):
+    if original_path and save_local_var.get() and is_archive_member(original_path):
+        # Save next to the archive
+        return write_archive_caption(description, filename, original_path)
+    elif original_path and save_local_var.get() and os.path.exists(original_path):
         # Save next to original file
         file_dir = os.path.dirname(original_path)
         file_path = os.path.join(file_dir, f'{filename}.txt')
     else:
-        # Save in dated folder
-        if not os.path.exists(folder_path):
-            os.makedirs(folder_path)
-        file_path = os.path.join(folder_path, f'{filename}.txt')
+        # Save in dated folder, arranged by the output layout
+        file_path = (output_layout or OutputLayout(folder_path)).path_for(source or original_path or filename, filename)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
     
-    with open(file_path, 'w', encoding='utf-8') as file:
-        file.write(description)
+    # Write through a temporary file so a partial caption never appears
+    write_text_atomic(file_path, description)
+    return file_path
 
 def update_save_options():
     """Update save options based on dependencies."""
     if not save_individual_var.get():
         save_local_var.set(False)
         save_local_checkbox.state(['disabled'])
-        overwrite_checkbox.state(['disabled'])
     else:
         save_local_checkbox.state(['!disabled'])
-        if save_local_var.get():
-            overwrite_checkbox.state(['!disabled'])
-        else:
-            overwrite_var.set(False)
-            overwrite_checkbox.state(['disabled'])
     save_settings()
 
-def process_images(image_urls, instruction_text, folder_path, batch_mode=False, status_callback=None):
-    global consecutive_errors, failed_files, total_prompt_tokens, total_completion_tokens, total_tokens
+def write_remaining_file(image_urls, folder_path):
+    """Write the inputs that were not processed to a file that can be passed to a later run."""
+    if not os.path.exists(folder_path):
+        os.makedirs(folder_path)
+    remaining_path = os.path.join(folder_path, 'remaining.txt')
+    with open(remaining_path, 'w', encoding='utf-8') as file:
+        file.write("\n".join(image_urls) + "\n")
+    return remaining_path
+
+def process_images(image_urls, instruction_text, folder_path, batch_mode=False, status_callback=None, stream=False,
+                   estimated_cost=None):
+    global consecutive_errors, failed_files, total_prompt_tokens, total_completion_tokens, total_tokens, payload_budget
+    global total_image_tokens_saved, concurrency_controller, time_to_first_token, refusals_cancelled, run_control
+    global run_stats, hedge_policy, output_layout, spend_governor, key_pool
+    global captions_requested, truncated_captions, continued_captions
+    global total_input_cost, total_output_cost, cascade_stats
+    from concurrent.futures import wait, FIRST_COMPLETED
+    from tqdm import tqdm
+    payload_budget = PayloadBudget(int(MAX_PAYLOAD_MB * 1024 * 1024))
     consecutive_errors = 0
     failed_files = []
     total_prompt_tokens = 0
     total_completion_tokens = 0
     total_tokens = 0
+    total_input_cost = 0.0
+    total_output_cost = 0.0
+    total_image_tokens_saved = 0
+    time_to_first_token = []
+    refusals_cancelled = 0
+    captions_requested = 0
+    truncated_captions = 0
+    continued_captions = 0
+    run_control = RunControl()
+    run_stats = RunStats(len(image_urls))
+    output_layout = OutputLayout(folder_path, OUTPUT_LAYOUT)
+    cascade_stats = CascadeStats()
+    if get_payload_cache() is not None:
+        get_payload_cache().reset_stats()
+    # Until actual costs are known, an input is assumed to cost as much as its most expensive path
+    if CASCADE_ENABLED:
+        worst_case_costs = [sum(costs) for costs in zip(*(get_token_costs(stage.model) for stage in get_cascade_stages()))]
+    else:
+        worst_case_costs = get_token_costs(MODEL)
+    spend_governor = SpendGovernor(MAX_RUN_COST, MAX_RUN_TOKENS, *worst_case_costs)
     
     pbar = tqdm(total=total_images, desc="Processing images", unit="img")
     
+    # Requests are spread over the API keys, so the run's limits are the sum of their tier limits
+    key_pool = KeyPool(get_api_keys(), ledger=get_quota_ledger())
+    
+    # Batch mode adapts the number of parallel requests to latency and rate limit feedback
+    if batch_mode:
+        concurrency_controller = ConcurrencyController(
+            initial=min(key_pool.total_rpm, INITIAL_CONCURRENCY * len(key_pool.keys)),
+            maximum=min(key_pool.total_rpm, MAX_CONCURRENCY * len(key_pool.keys))
+        )
+        hedge_policy = HedgePolicy(HEDGE_BUDGET_PERCENT / 100, len(image_urls), HEDGE_PERCENTILE / 100)
+    else:
+        concurrency_controller = ConcurrencyController(initial=1)
+        hedge_policy = HedgePolicy(0, 0)
+    
+    # Compressed tars are read in one pass when their members are captioned in the order they are stored
+    remaining = iter(archive_reader.in_stored_order(image_urls))
+    pending = {}
+    started = {}
+    hedge_groups = {}  # Inputs with a hedge, mapped to their requests still in flight
+    hedge_futures = set()
+    hedged_succeeded = set()
+    abandoned = {}  # Requests that lost to their duplicate but are still running, with the time the winner finished
+    reservations = {}  # Projected cost reserved for each request in flight
+    held_url = None  # Next input, waiting for room under the spend cap
+    detail = get_image_detail(instruction_text)
+    target_size = int(resolution_var.get())
+    not_processed = []
+    exhausted = False
+    last_dashboard_update = 0
+    last_status_write = 0
+    
+    def publish_dashboard(final=False):
+        nonlocal last_dashboard_update, last_status_write
+        now = time.monotonic()
+        if not final and now - last_dashboard_update < 1:
+            return
+        last_dashboard_update = now
+        dashboard = get_dashboard(estimated_cost, key_pool.total_tpm)
+        update_dashboard(dashboard)
+        if STATUS_FILE and (final or now - last_status_write >= STATUS_INTERVAL):
+            last_status_write = now
+            if final:
+                dashboard['state'] = 'cancelled' if run_control.is_cancelled() else 'finished'
+            try:
+                write_status_file(STATUS_FILE, dashboard)
+            except OSError:
+                pass
+    
+    def handle_result(image_url, future):
+        try:
+            description = future.result()
+            if description is not None:
+                filename = os.path.basename(image_url)
+                filename = urllib.parse.unquote(filename)
+                filename = os.path.splitext(filename)[0]
+                
+                # Save individual files (one per frame for videos in frame mode) and remember them for later runs
+                original_path = image_url if not is_url(image_url) else None
+                if isinstance(description, list):
+                    output_paths = [
+                        write_to_file(caption, f'{filename}_{timestamp:07.2f}s', folder_path, original_path, image_url)
+                        for timestamp, caption in description
+                    ]
+                else:
+                    output_paths = [write_to_file(description, filename, folder_path, original_path, image_url)]
+                try:
+                    get_output_index().record(get_output_index_key(image_url, instruction_text), output_paths[0])
+                except OSError:
+                    pass
+            
+            # Update progress regardless of success
+            run_stats.record_result(description is not None)
+            increment_progress()
+            pbar.update(1)
+            pbar.set_postfix(concurrency=concurrency_controller.current)
+            
+        except RunCancelled:
+            not_processed.append(image_url)
+            
+        except Exception as e:
+            run_stats.record_result(False)
+            if status_callback:
+                status_callback(strings.get('messages.processing.status.error', file=image_url, error=str(e)))
+            
+            # Check if we should abort
+            if MAX_CONSECUTIVE_ERRORS > 0 and consecutive_errors >= MAX_CONSECUTIVE_ERRORS:
+                raise RuntimeError(strings.get('messages.errors.abort', count=MAX_CONSECUTIVE_ERRORS))
+    
+    def reserve(image_url):
+        # Worst case cost of an input until the actual average is known
+        prompt_tokens = calculate_image_tokens(target_size, target_size, detail) + len(instruction_text) // 4
+        weight = VIDEO_MAX_FRAMES if is_video_input(image_url) else 1
+        return spend_governor.reserve(prompt_tokens, get_max_tokens(instruction_text), weight)
+    
+    def submit(image_url, reservation):
+        future = start_request_thread(analyze_image, image_url, instruction_text, status_callback, stream)
+        pending[future] = image_url
+        started[future] = time.monotonic()
+        reservations[future] = reservation
+        return future
+    
+    def in_flight():
+        return len(pending) + len(abandoned)
+    
+    def abandon(future, won_at=None):
+        # A request that was sent cannot be recalled, so the loser runs to completion and its result is dropped
+        if future.cancel():
+            spend_governor.release(reservations.pop(future, None), completed=False)
+            return
+        abandoned[future] = won_at
+        def finished(f):
+            spend_governor.release(reservations.pop(f, None), completed=False)
+            won_at = abandoned.pop(f, None)
+            if won_at is not None:
+                hedge_policy.record_saving(time.monotonic() - won_at)
+        future.add_done_callback(finished)
+    
+    def hedge_stragglers():
+        # Duplicate requests that run longer than the latency percentile, within the budget and free slots
+        threshold = hedge_policy.threshold()
+        if threshold is None or concurrency_controller.headroom <= concurrency_controller.headroom_threshold:
+            return
+        now = time.monotonic()
+        for future, image_url in list(pending.items()):
+            if in_flight() >= concurrency_controller.current:
+                break
+            if image_url in hedge_groups or now - started[future] < threshold:
+                continue
+            reservation = reserve(image_url)
+            if reservation is None or not hedge_policy.try_acquire():
+                spend_governor.release(reservation, completed=False)
+                break
+            hedge = submit(image_url, reservation)
+            hedge_futures.add(hedge)
+            hedge_groups[image_url] = {future, hedge}
+    
+    def collect(future):
+        image_url = pending.pop(future)
+        elapsed = time.monotonic() - started.pop(future)
+        spend_governor.release(reservations.pop(future, None), completed=not future.cancelled())
+        succeeded = not future.cancelled() and future.exception() is None and future.result() is not None
+        if succeeded:
+            hedge_policy.record_latency(elapsed)
+        
+        group = hedge_groups.pop(image_url, None)
+        if group:
+            siblings = [f for f in group if f is not future and f in pending]
+            if siblings and not succeeded:
+                # The other request may still succeed
+                hedge_groups[image_url] = set(siblings)
+                return
+            if succeeded:
+                hedged_succeeded.add(image_url)
+                if future in hedge_futures:
+                    hedge_policy.record_win()
+            won_at = time.monotonic() if succeeded and future in hedge_futures else None
+            for sibling in siblings:
+                pending.pop(sibling)
+                started.pop(sibling)
+                abandon(sibling, won_at)
+        
+        handle_result(image_url, future)
+    
     try:
-        if batch_mode:
-            # Get current tier limits
-            current_tier, tiers = get_rate_limits()
-            tier_limits = tiers[current_tier]
+        while not run_control.is_cancelled():
+            # Keep as many requests in flight as the controller allows, unless paused
+            while not exhausted and not run_control.is_paused() and in_flight() < concurrency_controller.current:
+                image_url = held_url if held_url is not None else next(remaining, None)
+                held_url = None
+                if image_url is None:
+                    exhausted = True
+                    break
+                reservation = reserve(image_url)
+                if reservation is None and spend_governor.refused:
+                    # Stop sending at the spend cap and let the requests in flight finish
+                    print(strings.get('messages.processing.budget_reached',
+                        cost="{:.4f}".format(spend_governor.spent_cost),
+                        tokens=spend_governor.spent_tokens
+                    ))
+                    not_processed.append(image_url)
+                    exhausted = True
+                    break
+                if reservation is None:
+                    # Wait for requests in flight to settle their cost
+                    held_url = image_url
+                    break
+                submit(image_url, reservation)
             
-            # Calculate optimal number of workers based on RPM
-            max_workers = min(tier_limits['rpm'], 10)  # Cap at 10 parallel workers
+            if hedge_policy.enabled and not run_control.is_paused():
+                hedge_stragglers()
             
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = []
-                for image_url in image_urls:
-                    future = executor.submit(
-                        analyze_image,
-                        image_url,
-                        instruction_text,
-                        status_callback
-                    )
-                    futures.append((image_url, future))
-                    
-                # Process results as they complete
-                for image_url, future in futures:
-                    try:
-                        description = future.result()
-                        if description is not None:
-                            filename = os.path.basename(image_url)
-                            filename = urllib.parse.unquote(filename)
-                            filename = os.path.splitext(filename)[0]
-                            
-                            # Save individual file
-                            write_to_file(description, filename, folder_path, image_url if not is_url(image_url) else None)
-                        
-                        # Update progress regardless of success
-                        increment_progress()
-                        pbar.update(1)
-                        
-                    except Exception as e:
-                        if status_callback:
-                            status_callback(strings.get('messages.processing.status.error', file=image_url, error=str(e)))
-                        
-                        # Check if we should abort
-                        if MAX_CONSECUTIVE_ERRORS > 0 and consecutive_errors >= MAX_CONSECUTIVE_ERRORS:
-                            raise RuntimeError(strings.get('messages.errors.abort', count=MAX_CONSECUTIVE_ERRORS))
-        else:
-            # Original sequential processing
-            for image_url in image_urls:
-                if status_callback:
-                    status_callback(strings.get('messages.processing.status.processing', file=image_url))
-                    
-                try:
-                    description = analyze_image(image_url, instruction_text, status_callback)
-                    if description is not None:
-                        filename = os.path.basename(image_url)
-                        filename = urllib.parse.unquote(filename)
-                        filename = os.path.splitext(filename)[0]
-                        
-                        # Save individual file
-                        write_to_file(description, filename, folder_path, image_url if not is_url(image_url) else None)
-                    
-                    # Update progress regardless of success
-                    increment_progress()
-                    pbar.update(1)
-                    
-                except Exception as e:
-                    if status_callback:
-                        status_callback(strings.get('messages.processing.status.error', file=image_url, error=str(e)))
-                    
-                    # Check if we should abort
-                    if MAX_CONSECUTIVE_ERRORS > 0 and consecutive_errors >= MAX_CONSECUTIVE_ERRORS:
-                        raise RuntimeError(strings.get('messages.errors.abort', count=MAX_CONSECUTIVE_ERRORS))
+            if not pending:
+                if exhausted:
+                    break
+                if run_control.is_paused():
+                    # Paused with nothing in flight
+                    run_control.wait_while_paused(timeout=0.2)
+                elif abandoned:
+                    # Only losing duplicates are running; wait for one to free its slot
+                    wait(abandoned.copy(), timeout=0.2, return_when=FIRST_COMPLETED)
+                else:
+                    # Waiting for the spend cap to let the next request through
+                    time.sleep(0.2)
+                continue
+            
+            # Process results as they complete, checking for pause and cancel in between
+            done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            for future in done:
+                # Both requests of a hedged input can finish together, and the first one collected drops the other
+                if future in pending:
+                    collect(future)
+            publish_dashboard()
+        
+        if run_control.is_cancelled():
+            # Drop requests that have not started and give the in-flight ones a deadline
+            print(strings.get('messages.processing.cancelling', count=len(pending), seconds=CANCEL_DEADLINE))
+            for future in pending:
+                future.cancel()
+            done, _ = wait(pending, timeout=CANCEL_DEADLINE)
+            for future in done:
+                if future not in pending:
+                    continue
+                if future.cancelled():
+                    not_processed.append(pending.pop(future))
+                else:
+                    collect(future)
     
     finally:
+        publish_dashboard(final=True)
         pbar.close()
+        caption_archives.close()
+        archive_reader.close()
+        try:
+            get_output_budgets().save()
+            if key_pool.ledger is not None:
+                key_pool.ledger.flush()
+            if get_payload_cache() is not None:
+                get_payload_cache().save()
+        except OSError:
+            pass
+        
+        # Record the inputs that were not processed so they can be run later
+        not_processed.extend(pending.values())
+        if held_url is not None:
+            not_processed.append(held_url)
+        # Originals still running after their hedge won have saved at least the time since
+        for future in list(abandoned):
+            won_at = abandoned.pop(future, None)
+            if won_at is not None:
+                hedge_policy.record_saving(time.monotonic() - won_at)
+        not_processed.extend(remaining)
+        not_processed = [url for url in dict.fromkeys(not_processed) if url not in hedged_succeeded]
+        
+        # Errors of requests whose duplicate succeeded are not failures
+        failed_files = [entry for entry in failed_files if entry[0] not in hedged_succeeded]
+        if not_processed:
+            remaining_path = write_remaining_file(not_processed, folder_path)
+            print(strings.get('messages.processing.remaining', count=len(not_processed), file=remaining_path))
         
         # Calculate token costs
-        input_cost = total_prompt_tokens * TOKEN_COST_INPUT
-        output_cost = total_completion_tokens * TOKEN_COST_OUTPUT
+        input_cost = total_input_cost
+        output_cost = total_output_cost
         total_cost = input_cost + output_cost
         
         # Format costs before string formatting
@@ -481,10 +1617,23 @@ def process_images(image_urls, instruction_text, folder_path, batch_mode=False,
         print(strings.get('messages.console.token_usage.input', count=total_prompt_tokens))
         print(strings.get('messages.console.token_usage.output', count=total_completion_tokens))
         print(strings.get('messages.console.token_usage.total', count=total_tokens))
+        print(get_token_saving_summary())
+        if time_to_first_token or refusals_cancelled:
+            print(get_streaming_summary())
+        if hedge_policy.hedges:
+            print(get_hedging_summary())
+        if cascade_stats.inputs:
+            print(get_cascade_summary())
+        print(get_truncation_summary(instruction_text))
+        if len(key_pool.keys) > 1:
+            print(get_key_summary())
+        if key_pool.ledger is not None:
+            print(get_daily_usage_summary())
         print(strings.get('messages.console.token_usage.cost.header'))
         print(strings.get('messages.console.token_usage.cost.input', cost=input_cost_str))
         print(strings.get('messages.console.token_usage.cost.output', cost=output_cost_str))
         print(strings.get('messages.console.token_usage.cost.total', cost=total_cost_str))
+        print(get_memory_summary())
         
         # Print error summary to console
         if failed_files:
@@ -496,36 +1645,189 @@ def process_images(image_urls, instruction_text, folder_path, batch_mode=False,
                 print(strings.get('messages.console.errors.error_prefix') + error)
             print("\n" + "="*50 + "\n")
 
-def validate_images(all_images):
-    """Validate image files and return statistics."""
+def get_token_saving_summary():
+    """Describe the image tokens saved by the resize policy and detail level."""
+    return strings.get('messages.console.token_usage.saved',
+        count=total_image_tokens_saved,
+        cost="{:.4f}".format(total_image_tokens_saved * TOKEN_COST_INPUT)
+    )
+
+def get_streaming_summary():
+    """Describe time to first token and early refusal cancellations of a streamed run."""
+    ttft = sorted(time_to_first_token)
+    return strings.get('messages.console.streaming.summary',
+        average="{:.2f}".format(sum(ttft) / len(ttft)) if ttft else "?",
+        p95="{:.2f}".format(ttft[min(len(ttft) - 1, int(len(ttft) * 0.95))]) if ttft else "?",
+        refusals=refusals_cancelled
+    )
+
+def get_hedging_summary():
+    """Describe the duplicate requests sent for stragglers, their extra spend and the time they saved."""
+    requests_sent = run_stats.processed + hedge_policy.hedges
+    spend = total_input_cost + total_output_cost
+    return strings.get('messages.console.hedging.summary',
+        hedges=hedge_policy.hedges,
+        percent="{:.1f}".format(hedge_policy.hedges * 100 / max(1, run_stats.processed)),
+        cost="{:.4f}".format(spend * hedge_policy.hedges / max(1, requests_sent)),
+        wins=hedge_policy.wins,
+        saved="{:.1f}".format(hedge_policy.time_saved),
+        longest="{:.1f}".format(hedge_policy.longest_saving)
+    )
+
+def get_cascade_summary():
+    """Describe the requests, cost and latency of each cascade stage and why inputs were escalated."""
+    cheap, strong = get_cascade_stages()
+    escalated = sum(cascade_stats.escalations.values())
+    summary = strings.get('messages.console.cascade.summary',
+        inputs=cascade_stats.inputs,
+        escalated=escalated,
+        rate="{:.1f}".format(escalated * 100 / max(1, cascade_stats.inputs)),
+        reasons=", ".join(f"{reason} {count}" for reason, count in cascade_stats.escalations.most_common()) or "-"
+    )
+    for stage in (cheap, strong):
+        summary += "\n" + strings.get('messages.console.cascade.stage',
+            stage=stage.name,
+            model=stage.model,
+            requests=cascade_stats.requests[stage.name],
+            cost="{:.4f}".format(cascade_stats.cost[stage.name]),
+            average_cost="{:.5f}".format(cascade_stats.average_cost(stage.name)),
+            latency="{:.2f}".format(cascade_stats.average_latency(stage.name))
+        )
+    total_cost = sum(cascade_stats.cost.values())
+    summary += "\n" + strings.get('messages.console.cascade.average',
+        cost="{:.5f}".format(total_cost / max(1, cascade_stats.inputs)),
+        strong_cost="{:.5f}".format(cascade_stats.average_cost(strong.name)) if cascade_stats.requests[strong.name] else "?"
+    )
+    return summary
+
+def get_truncation_summary(instruction_text):
+    """Describe how many captions were cut off at max_tokens and the output budget of the prompt."""
+    return strings.get('messages.console.truncation.summary',
+        truncated=truncated_captions,
+        total=captions_requested,
+        rate="{:.1f}".format(truncated_captions * 100 / max(1, captions_requested)),
+        continued=continued_captions,
+        max_tokens=get_max_tokens(instruction_text)
+    )
+
+def get_key_summary():
+    """Describe the requests, tokens and errors of each API key of the pool."""
+    return "\n".join(
+        strings.get('messages.console.keys.summary',
+            key=key.name,
+            tier=key.tier,
+            requests=key.requests,
+            tokens=key.tokens,
+            errors=key.errors,
+            state=strings.get('messages.console.keys.quarantined') if key.quarantined_until == float('inf') else ''
+        )
+        for key in key_pool.keys
+    )
+
+def get_daily_usage_summary():
+    """Describe today's usage of the run's keys by every run and process, from the quota ledger."""
+    usages = [key_pool.ledger.usage_today(key.key_id) for key in key_pool.keys]
+    requests_left = get_daily_requests_left(key_pool.keys)
+    return strings.get('messages.console.quota.summary',
+        requests=sum(usage.requests for usage in usages),
+        tokens=sum(usage.prompt_tokens + usage.completion_tokens for usage in usages),
+        cost="{:.4f}".format(sum(usage.cost for usage in usages)),
+        left=requests_left if requests_left is not None else strings.get('messages.console.quota.unlimited')
+    )
+
+def get_memory_summary():
+    """Describe peak memory use of the run for the summary."""
+    peak_rss = get_peak_rss()
+    summary = strings.get('messages.console.memory.summary',
+        rss="{:.1f}".format(peak_rss / (1024 * 1024)) if peak_rss else "?",
+        payload="{:.1f}".format(payload_budget.peak / (1024 * 1024)),
+        budget="{:.0f}".format(MAX_PAYLOAD_MB)
+    )
+    cache = get_payload_cache()
+    if cache is not None and (cache.hits or cache.stored):
+        summary += "\n" + strings.get('messages.console.payload_cache.summary',
+            hits=cache.hits,
+            stored=cache.stored,
+            size="{:.1f}".format(cache.live_bytes / (1024 * 1024)),
+            limit="{:.0f}".format(PAYLOAD_CACHE_MB)
+        )
+    return summary
+
+def check_web_urls(urls):
+    """
+    Check web URLs concurrently and return the reason each failing one cannot
+    be captioned. Results are cached in CACHE_DIR for URL_PREFLIGHT_TTL_HOURS.
+    """
+    urls = [url for url in urls if url.startswith(('http://', 'https://'))]
+    if not URL_PREFLIGHT or not urls:
+        return {}
+    results = preflight_urls(
+        urls,
+        cache=PreflightCache(os.path.join(CACHE_DIR, 'url_preflight.json'), URL_PREFLIGHT_TTL_HOURS * 3600),
+        concurrency=URL_PREFLIGHT_CONCURRENCY,
+        timeout=URL_PREFLIGHT_TIMEOUT,
+        max_bytes=int(URL_MAX_MB * 1024 * 1024)
+    )
+    return {url: result.reason for url, result in results.items() if not result.ok}
+
+def validate_images(all_images, instruction_text=''):
+    """
+    Validate image files and return statistics. Unless overwriting is enabled,
+    inputs already captioned with the same prompt in any earlier run are skipped.
+    Web URLs that are unreachable, not images or too large count as not found.
+    """
     total_attempted = len(all_images)
     to_process = []
     ignored = []
     not_found = []
+    skip_existing = not overwrite_var.get()
+    index = get_output_index() if skip_existing else None
+    directory_listings = {}
     
     for image_url in all_images:
         if is_url(image_url):
+            if skip_existing and index.lookup(get_output_index_key(image_url, instruction_text)):
+                ignored.append(image_url)
+                continue
             to_process.append(image_url)
         else:
             # Check if file exists
-            if not os.path.exists(image_url):
+            try:
+                stat_result = get_input_stat(image_url)
+            except OSError:
                 not_found.append(image_url)
                 continue
-                
-            # Check if output file exists and should be skipped
-            if save_local_var.get() and not overwrite_var.get():
-                filename = os.path.basename(image_url)
-                filename = urllib.parse.unquote(filename)
-                filename = os.path.splitext(filename)[0]
-                file_dir = os.path.dirname(image_url)
-                file_path = os.path.join(file_dir, f'{filename}.txt')
-                
-                if os.path.exists(file_path):
+            
+            if skip_existing:
+                # Skip inputs captioned with this prompt in an earlier run
+                if index.lookup(get_output_index_key(image_url, instruction_text, stat_result)):
                     ignored.append(image_url)
                     continue
+                
+                # Captions saved next to the images may also come from other tools,
+                # so check them against one directory listing per folder
+                if save_local_var.get():
+                    file_dir = os.path.dirname(image_url)
+                    if file_dir not in directory_listings:
+                        try:
+                            directory_listings[file_dir] = set(os.listdir(file_dir or '.'))
+                        except OSError:
+                            directory_listings[file_dir] = set()
+                    filename = os.path.basename(image_url)
+                    filename = urllib.parse.unquote(filename)
+                    filename = os.path.splitext(filename)[0]
+                    if f'{filename}.txt' in directory_listings[file_dir]:
+                        ignored.append(image_url)
+                        continue
             
             to_process.append(image_url)
     
+    # Check the remaining URLs before any request is billed
+    rejected_urls = check_web_urls([image_url for image_url in to_process if is_url(image_url)])
+    if rejected_urls:
+        to_process = [image_url for image_url in to_process if image_url not in rejected_urls]
+        not_found.extend(rejected_urls)
+    
     # Print validation results to console
     print(strings.get('messages.console.validation.header'))
     print(strings.get('messages.console.validation.total', total=total_attempted))
@@ -539,7 +1841,11 @@ def validate_images(all_images):
     if not_found:
         print(strings.get('messages.console.validation.not_found_header'))
         for f in not_found:
-            print(strings.get('messages.console.validation.file_prefix') + f)
+            if f in rejected_urls:
+                print(strings.get('messages.console.validation.file_prefix') + strings.get(
+                    'messages.console.validation.url_rejected', url=f, reason=rejected_urls[f]))
+            else:
+                print(strings.get('messages.console.validation.file_prefix') + f)
     
     print("\n" + "="*50 + "\n")
     
@@ -551,8 +1857,13 @@ def validate_images(all_images):
     }
 
 def estimate_cost(number_of_images, instruction_text, image_urls):
-    # Get base cost per image based on resolution
+    # Count videos by their largest number of sampled frames
+    number_of_images += (VIDEO_MAX_FRAMES - 1) * sum(1 for image_url in image_urls if is_video_input(image_url))
+    
+    # Get base cost per image based on resolution; in cascade mode every input goes through the cheap stage
     resolution = int(resolution_var.get())
+    if CASCADE_ENABLED and CASCADE_CHEAP_RESOLUTION:
+        resolution = CASCADE_CHEAP_RESOLUTION
     if resolution == 2048:
         cost_per_image = 0.00563
     elif resolution == 1024:
@@ -590,7 +1901,11 @@ def estimate_cost(number_of_images, instruction_text, image_urls):
     else:  # 512
         total_cost *= 0.3
 
-    return total_cost
+    # Subtract the image tokens saved by the resize policy and detail level
+    tokens_saved = estimate_image_token_saving(image_urls, instruction_text)
+    total_cost = max(0.0, total_cost - tokens_saved * TOKEN_COST_INPUT)
+
+    return total_cost, tokens_saved
 
 def generate_captions():
     # Get web URLs
@@ -600,15 +1915,8 @@ def generate_captions():
     else:
         web_urls = extract_image_urls(web_text)
     
-    # Get local files
-    local_text = local_text_area.get("1.0", tk.END).strip()
-    if local_text == strings.get('ui.local_files.placeholder'):
-        local_files = []
-    else:
-        local_files = extract_image_urls(local_text)
-
     # Combine URLs and files
-    all_images = web_urls + local_files
+    all_images = web_urls + local_files.items()
     
     if not all_images:
         messagebox.showerror(
@@ -617,36 +1925,73 @@ def generate_captions():
         )
         return
 
-    # Validate images
-    validation = validate_images(all_images)
-    if not validation['to_process']:
-        messagebox.showerror(
-            strings.get('messages.dialogs.error.title'),
-            strings.get('messages.validation.no_valid_images')
+    instruction_text = instructions_entry.get("1.0", "end-1c").strip()
+
+    # Validate in a separate thread, as checking web URLs can take a while
+    generate_button.config(text=strings.get('ui.generate.validating_text'), state="disabled")
+    threading.Thread(
+        target=threaded_validate_images,
+        args=(all_images, instruction_text),
+        daemon=True
+    ).start()
+
+
+def threaded_validate_images(all_images, instruction_text):
+    """Validate the inputs and estimate the cost in a separate thread to keep UI responsive."""
+    try:
+        validation = validate_images(all_images, instruction_text)
+        if not validation['to_process']:
+            def show_no_valid_images():
+                generate_button.config(text=strings.get('ui.generate.button_text'), state="normal")
+                messagebox.showerror(
+                    strings.get('messages.dialogs.error.title'),
+                    strings.get('messages.validation.no_valid_images')
+                )
+            root.after(0, show_no_valid_images)
+            return
+            
+        # Build validation message
+        validation_msg = strings.get('messages.validation.summary',
+            total=validation['total_attempted'],
+            to_process=len(validation['to_process'])
         )
-        return
         
-    # Build validation message
-    validation_msg = strings.get('messages.validation.summary',
-        total=validation['total_attempted'],
-        to_process=len(validation['to_process'])
-    )
-    
-    if validation['ignored']:
-        validation_msg += strings.get('messages.validation.skipped',
-            count=len(validation['ignored'])
-        )
+        if validation['ignored']:
+            validation_msg += strings.get('messages.validation.skipped',
+                count=len(validation['ignored'])
+            )
+            
+        if validation['not_found']:
+            validation_msg += strings.get('messages.validation.not_found',
+                count=len(validation['not_found'])
+            )
         
-    if validation['not_found']:
-        validation_msg += strings.get('messages.validation.not_found',
-            count=len(validation['not_found'])
-        )
-    
-    instruction_text = instructions_entry.get("1.0", "end-1c").strip()
+        requests_left = get_daily_requests_left(get_api_keys())
+        if requests_left is not None and requests_left < len(validation['to_process']):
+            validation_msg += strings.get('messages.validation.daily_limit', left=requests_left)
+
+        # Calculate the estimated cost including token-based costs
+        cost, tokens_saved = estimate_cost(len(validation['to_process']), instruction_text, validation['to_process'])
+        if tokens_saved:
+            validation_msg += strings.get('messages.validation.tokens_saved',
+                tokens=tokens_saved,
+                cost="{:.4f}".format(tokens_saved * TOKEN_COST_INPUT)
+            )
+    except Exception as e:
+        error_msg = str(e)
+        
+        def show_error():
+            generate_button.config(text=strings.get('ui.generate.button_text'), state="normal")
+            messagebox.showerror(strings.get('messages.dialogs.error.title'), error_msg)
+            
+        root.after(0, show_error)
+        return
 
-    # Calculate the estimated cost including token-based costs
-    cost = estimate_cost(len(validation['to_process']), instruction_text, validation['to_process'])
+    root.after(0, lambda: confirm_and_start(validation['to_process'], instruction_text, validation_msg, cost))
 
+
+def confirm_and_start(to_process, instruction_text, validation_msg, cost):
+    """Ask the user to confirm the estimated cost and start the run."""
     # Format the cost string with 4 decimal places instead of 2
     cost_str = "{:.4f}".format(cost)
 
@@ -655,343 +2000,34 @@ def generate_captions():
         strings.get('messages.dialogs.validation.title'),
         strings.get('messages.dialogs.validation.message',
             validation=validation_msg,
-            count=len(validation['to_process']),
+            count=len(to_process),
             cost=cost_str
         )
     )
     
     if proceed:
-        print(strings.get('messages.processing.start', count=len(validation['to_process'])))
+        print(strings.get('messages.processing.start', count=len(to_process)))
         # Update the UI to indicate processing
         generate_button.config(text=strings.get('ui.generate.processing_text'), state="disabled")
+        set_run_buttons_state(running=True)
 
-        date_folder = datetime.datetime.now().strftime('%Y-%m-%d')
-        global time_folder  # Declare time_folder as global to use in the threaded function
-        time_folder = datetime.datetime.now().strftime('%Y-%m-%d - %H.%M.%S')
-        
-        # Get the root directory (parent of scripts)
-        root_dir = os.path.dirname(SCRIPT_DIR)
-        output_folder = os.path.join(root_dir, 'output', date_folder, time_folder)
+        output_folder = get_output_folder()
 
         # Create and start a new thread for the process_images function
         threading.Thread(
             target=threaded_process_images,
-            args=(validation['to_process'], instruction_text, output_folder, batch_var.get()),
+            args=(to_process, instruction_text, output_folder, batch_var.get(), stream_var.get(), cost),
             daemon=True
         ).start()
     else:
+        generate_button.config(text=strings.get('ui.generate.button_text'), state="normal")
         messagebox.showinfo(
             strings.get('messages.dialogs.cancelled.title'),
             strings.get('messages.dialogs.cancelled.message')
         )
 
-# GUI setup
-root = TkinterDnD.Tk()  # Use TkinterDnD.Tk instead of tk.Tk
-root.title(strings.get('ui.window.title'))
-
-# Add window closing handler
-def on_closing():
-    save_settings()
-    root.destroy()
-
-root.protocol("WM_DELETE_WINDOW", on_closing)
-
-# Main window size, width and height
-root.geometry("1000x700")
-
-# Main container with padding
-main_frame = ttk.Frame(root, padding="10")
-main_frame.pack(fill=tk.BOTH, expand=True)
-
-# Web URLs Frame
-web_frame = ttk.LabelFrame(main_frame, text=strings.get('ui.web_urls.frame_title'), padding="5")
-web_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
-
-# Web URLs text area with scrollbar
-web_scroll = ttk.Scrollbar(web_frame)
-web_scroll.pack(side=tk.RIGHT, fill=tk.Y)
-
-web_text_area = tk.Text(web_frame, height=6, yscrollcommand=web_scroll.set)
-web_text_area.pack(fill=tk.BOTH, expand=True, pady=5)
-web_text_area.insert("1.0", strings.get('ui.web_urls.placeholder'))
-web_text_area.configure(fg='gray')
-web_scroll.config(command=web_text_area.yview)
-
-def on_web_focus_in(event):
-    if web_text_area.get("1.0", "end-1c") == strings.get('ui.web_urls.placeholder'):
-        web_text_area.delete("1.0", "end")
-        web_text_area.configure(fg='black')
-
-def on_web_focus_out(event):
-    if not web_text_area.get("1.0", "end-1c").strip():
-        web_text_area.insert("1.0", strings.get('ui.web_urls.placeholder'))
-        web_text_area.configure(fg='gray')
-
-web_text_area.bind('<FocusIn>', on_web_focus_in)
-web_text_area.bind('<FocusOut>', on_web_focus_out)
-
-# Local Files Frame
-local_frame = ttk.LabelFrame(main_frame, text=strings.get('ui.local_files.frame_title'), padding="5")
-local_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
-
-# Local files text area with scrollbar
-local_scroll = ttk.Scrollbar(local_frame)
-local_scroll.pack(side=tk.RIGHT, fill=tk.Y)
-
-local_text_area = tk.Text(local_frame, height=6, yscrollcommand=local_scroll.set)
-local_text_area.pack(fill=tk.BOTH, expand=True, pady=5)
-local_text_area.insert("1.0", strings.get('ui.local_files.placeholder'))
-local_text_area.configure(fg='gray')
-local_scroll.config(command=local_text_area.yview)
-
-def on_local_focus_in(event):
-    if local_text_area.get("1.0", "end-1c") == strings.get('ui.local_files.placeholder'):
-        local_text_area.delete("1.0", "end")
-        local_text_area.configure(fg='black')
-
-def on_local_focus_out(event):
-    if not local_text_area.get("1.0", "end-1c").strip():
-        local_text_area.insert("1.0", strings.get('ui.local_files.placeholder'))
-        local_text_area.configure(fg='gray')
-
-local_text_area.bind('<FocusIn>', on_local_focus_in)
-local_text_area.bind('<FocusOut>', on_local_focus_out)
-
-def handle_drop(event):
-    # Get the dropped files
-    files = event.data
-    if files:
-        # Convert the dropped data to a list of files
-        if isinstance(files, str):
-            files = root.tk.splitlist(files)
-        
-        # Filter for image files
-        valid_extensions = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp')
-        image_files = [f for f in files if os.path.splitext(f)[1].lower() in valid_extensions]
-        
-        if image_files:
-            # Get current text if it's not the placeholder
-            current_text = local_text_area.get("1.0", tk.END).strip()
-            if current_text == strings.get('ui.local_files.placeholder'):
-                current_files = set()
-            else:
-                current_files = set(current_text.split("\n") if current_text else [])
-            
-            # Add new files
-            current_files.update(image_files)
-            
-            # Update text area with absolute paths
-            local_text_area.delete("1.0", tk.END)
-            local_text_area.insert("1.0", "\n".join(sorted(os.path.abspath(f) for f in current_files)))
-            local_text_area.configure(fg='black')
-
-# Enable drag and drop
-local_text_area.drop_target_register(DND_FILES)
-local_text_area.dnd_bind('<<Drop>>', handle_drop)
-
-# Local files buttons
-local_button_frame = ttk.Frame(local_frame)
-local_button_frame.pack(fill=tk.X)
-
-def browse_files():
-    files = filedialog.askopenfilenames(
-        title=strings.get('ui.local_files.dialog_title'),
-        filetypes=[
-            (strings.get('ui.local_files.file_types.images'), "*.jpg *.jpeg *.png *.gif *.bmp *.webp"),
-            (strings.get('ui.local_files.file_types.all'), "*.*")
-        ]
-    )
-    if files:
-        # Get current text if it's not the placeholder
-        current_text = local_text_area.get("1.0", tk.END).strip()
-        if current_text == strings.get('ui.local_files.placeholder'):
-            current_files = set()
-        else:
-            current_files = set(current_text.split("\n") if current_text else [])
-        
-        # Add new files
-        current_files.update(files)
-        
-        # Update text area with absolute paths
-        local_text_area.delete("1.0", tk.END)
-        local_text_area.insert("1.0", "\n".join(sorted(os.path.abspath(f) for f in current_files)))
-        local_text_area.configure(fg='black')
-
-ttk.Button(
-    local_button_frame,
-    text=strings.get('ui.local_files.browse_button'),
-    command=browse_files
-).pack(side=tk.LEFT, padx=5)
-
-ttk.Button(
-    local_button_frame,
-    text=strings.get('ui.local_files.clear_button'),
-    command=lambda: (local_text_area.delete("1.0", tk.END), on_local_focus_out(None))
-).pack(side=tk.LEFT)
-
-# Processing Options Frame
-options_frame = ttk.LabelFrame(main_frame, text=strings.get('ui.options.frame_title'), padding="5")
-options_frame.pack(fill=tk.X, pady=(0, 10))
-
-# Left side options (Save options)
-left_options = ttk.Frame(options_frame)
-left_options.pack(side=tk.LEFT, fill=tk.X, expand=True)
-
-# Save options
-save_individual_var = tk.BooleanVar(value=True)
-save_individual_checkbox = ttk.Checkbutton(
-    left_options,
-    text=strings.get('ui.options.save_individual.text'),
-    variable=save_individual_var,
-    command=update_save_options
-)
-CreateToolTip(save_individual_checkbox, strings.get('ui.options.save_individual.tooltip'))
-save_individual_checkbox.pack(side=tk.LEFT, padx=5)
-
-save_local_var = tk.BooleanVar(value=False)
-save_local_checkbox = ttk.Checkbutton(
-    left_options,
-    text=strings.get('ui.options.save_local.text'),
-    variable=save_local_var,
-    command=update_save_options
-)
-CreateToolTip(save_local_checkbox, strings.get('ui.options.save_local.tooltip'))
-save_local_checkbox.pack(side=tk.LEFT, padx=5)
-
-overwrite_var = tk.BooleanVar(value=True)
-overwrite_checkbox = ttk.Checkbutton(
-    left_options,
-    text=strings.get('ui.options.overwrite.text'),
-    variable=overwrite_var,
-    command=update_save_options
-)
-CreateToolTip(overwrite_checkbox, strings.get('ui.options.overwrite.tooltip'))
-overwrite_checkbox.pack(side=tk.LEFT, padx=5)
-
-# Right side options (Batch Processing and Tier selection)
-right_options = ttk.Frame(options_frame)
-right_options.pack(side=tk.RIGHT, fill=tk.X)
-
-# Resolution dropdown
-resolution_var = tk.StringVar(value="1024")
-resolution_label = ttk.Label(right_options, text=strings.get('ui.options.resolution.label'))
-resolution_label.pack(side=tk.LEFT, padx=(5, 0))
-CreateToolTip(resolution_label, strings.get('ui.options.resolution.tooltip'))
-
-resolution_dropdown = ttk.Combobox(
-    right_options,
-    textvariable=resolution_var,
-    values=["512", "1024", "2048"],
-    state="readonly",
-    width=6
-)
-CreateToolTip(resolution_dropdown, strings.get('ui.options.resolution.tooltip'))
-resolution_dropdown.pack(side=tk.LEFT, padx=5)
-resolution_dropdown.bind('<<ComboboxSelected>>', lambda e: save_settings())
-
-# Batch processing toggle
-batch_var = tk.BooleanVar(value=False)
-batch_checkbox = ttk.Checkbutton(
-    right_options,
-    text=strings.get('ui.options.batch.text'),
-    variable=batch_var,
-    command=save_settings
-)
-CreateToolTip(batch_checkbox, strings.get('ui.options.batch.tooltip'))
-batch_checkbox.pack(side=tk.LEFT, padx=5)
-
-# Get current tier and available tiers
-current_tier, tiers = get_rate_limits()
-tier_var = tk.StringVar(value=current_tier)
-
-tier_label = ttk.Label(right_options, text=strings.get('ui.options.tier.label'))
-tier_label.pack(side=tk.LEFT, padx=(10, 0))
-CreateToolTip(tier_label, strings.get('ui.options.tier.tooltip'))
-
-tier_dropdown = ttk.Combobox(
-    right_options,
-    textvariable=tier_var,
-    values=list(tiers.keys()),
-    state="readonly",
-    width=10
-)
-tier_dropdown.pack(side=tk.LEFT, padx=5)
-CreateToolTip(tier_dropdown, strings.get('ui.options.tier.tooltip'))
-
-def update_tier(event=None):
-    set_key(os.path.join(SCRIPT_DIR, '.env'), 'CURRENT_TIER', tier_var.get())
-    save_settings()
-
-tier_dropdown.bind('<<ComboboxSelected>>', update_tier)
-
-# Instructions Frame
-instructions_frame = ttk.LabelFrame(main_frame, text=strings.get('ui.instructions.frame_title'), padding="5")
-instructions_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
-
-# Prompt Library Dropdown
-prompts = load_prompts()
-prompt_var = tk.StringVar(value=strings.get('ui.instructions.prompt_default'))
 
-def update_prompt(*args):
-    selected = prompt_var.get()
-    for title, text in prompts:
-        if title == selected:
-            instructions_entry.delete("1.0", tk.END)
-            instructions_entry.insert("1.0", text)
-            save_settings()
-            break
-
-prompt_dropdown = ttk.Combobox(
-    instructions_frame,
-    textvariable=prompt_var,
-    values=[title for title, _ in prompts],
-    state="readonly",
-    width=40
-)
-prompt_dropdown.pack(fill=tk.X, pady=(0, 5))
-prompt_dropdown.bind('<<ComboboxSelected>>', update_prompt)
-
-instructions_scroll = ttk.Scrollbar(instructions_frame)
-instructions_scroll.pack(side=tk.RIGHT, fill=tk.Y)
-
-instructions_entry = tk.Text(instructions_frame, height=6, yscrollcommand=instructions_scroll.set)
-instructions_entry.pack(fill=tk.BOTH, expand=True, pady=5)
-instructions_scroll.config(command=instructions_entry.yview)
-
-# Generate button frame
-button_frame = ttk.Frame(main_frame)
-button_frame.pack(fill=tk.X, pady=(0, 10))
-
-# Generate button with increased height
-style = ttk.Style()
-style.configure('Tall.TButton', padding=10)
-generate_button = ttk.Button(
-    button_frame,
-    text=strings.get('ui.generate.button_text'),
-    command=generate_captions,
-    style='Tall.TButton'
-)
-generate_button.pack(fill=tk.X)
-
-# Status frame with progress bar
-status_frame = ttk.Frame(main_frame)
-status_frame.pack(fill=tk.X, pady=(0, 10))
-
-# Progress bar
-progress_var = tk.DoubleVar()
-progress_bar = ttk.Progressbar(
-    status_frame,
-    variable=progress_var,
-    maximum=100,
-    mode='determinate'
-)
-progress_bar.pack(fill=tk.X, pady=(0, 5))
-
-# Status label
-status_label = ttk.Label(status_frame, text="")
-status_label.pack(fill=tk.X)
-
-def threaded_process_images(image_urls, instruction_text, output_folder, batch_mode):
+def threaded_process_images(image_urls, instruction_text, output_folder, batch_mode, stream=False, estimated_cost=None):
     """Process images in a separate thread to keep UI responsive."""
     global total_images, processed_images
     total_images = len(image_urls)
@@ -1005,7 +2041,9 @@ def threaded_process_images(image_urls, instruction_text, output_folder, batch_m
             instruction_text,
             output_folder,
             batch_mode,
-            status_callback=update_status
+            status_callback=update_status,
+            stream=stream,
+            estimated_cost=estimated_cost
         )
         
         update_status(strings.get('messages.processing.complete'))
@@ -1013,10 +2051,11 @@ def threaded_process_images(image_urls, instruction_text, output_folder, batch_m
         # Update the UI after processing is complete
         def update_ui():
             generate_button.config(text=strings.get('ui.generate.button_text'), state="normal")
+            set_run_buttons_state(running=False)
             
             # Calculate token costs
-            input_cost = total_prompt_tokens * TOKEN_COST_INPUT
-            output_cost = total_completion_tokens * TOKEN_COST_OUTPUT
+            input_cost = total_input_cost
+            output_cost = total_output_cost
             total_cost = input_cost + output_cost
             
             # Format costs before string formatting
@@ -1034,6 +2073,12 @@ def threaded_process_images(image_urls, instruction_text, output_folder, batch_m
                 output_cost=f"${output_cost_str}",
                 total_cost=f"${total_cost_str}"
             )
+            msg += "\n" + get_token_saving_summary()
+            if time_to_first_token or refusals_cancelled:
+                msg += "\n" + get_streaming_summary()
+            if cascade_stats.inputs:
+                msg += "\n" + get_cascade_summary()
+            msg += "\n" + get_memory_summary()
             
             if failed_files:
                 msg += strings.get('messages.errors.group.header', count=len(failed_files))
@@ -1056,6 +2101,11 @@ def threaded_process_images(image_urls, instruction_text, output_folder, batch_m
             if MAX_CONSECUTIVE_ERRORS > 0 and consecutive_errors >= MAX_CONSECUTIVE_ERRORS:
                 msg += strings.get('messages.errors.abort', count=MAX_CONSECUTIVE_ERRORS)
             
+            if run_control.is_cancelled():
+                msg += strings.get('messages.dialogs.results.cancelled')
+            elif spend_governor.refused:
+                msg += strings.get('messages.dialogs.results.budget_reached')
+            
             messagebox.showinfo(strings.get('messages.dialogs.results.title'), msg)
             
         root.after(0, update_ui)
@@ -1066,10 +2116,11 @@ def threaded_process_images(image_urls, instruction_text, output_folder, batch_m
         
         def show_error():
             generate_button.config(text=strings.get('ui.generate.button_text'), state="normal")
+            set_run_buttons_state(running=False)
             
             # Calculate token costs
-            input_cost = total_prompt_tokens * TOKEN_COST_INPUT
-            output_cost = total_completion_tokens * TOKEN_COST_OUTPUT
+            input_cost = total_input_cost
+            output_cost = total_output_cost
             total_cost = input_cost + output_cost
             
             # Format costs before string formatting
@@ -1088,6 +2139,12 @@ def threaded_process_images(image_urls, instruction_text, output_folder, batch_m
                 output_cost=f"${output_cost_str}",
                 total_cost=f"${total_cost_str}"
             )
+            msg += "\n" + get_token_saving_summary()
+            if time_to_first_token or refusals_cancelled:
+                msg += "\n" + get_streaming_summary()
+            if cascade_stats.inputs:
+                msg += "\n" + get_cascade_summary()
+            msg += "\n" + get_memory_summary()
             
             if failed_files:
                 msg += strings.get('messages.errors.group.header', count=len(failed_files))
@@ -1111,7 +2168,544 @@ def threaded_process_images(image_urls, instruction_text, output_folder, batch_m
             
         root.after(0, show_error)
 
-# Load settings after all UI elements are created
-load_settings()
 
-root.mainloop()
\ No newline at end of file
+# GUI callbacks
+def on_closing():
+    save_settings()
+    root.destroy()
+
+def on_web_focus_in(event):
+    if web_text_area.get("1.0", "end-1c") == strings.get('ui.web_urls.placeholder'):
+        web_text_area.delete("1.0", "end")
+        web_text_area.configure(fg='black')
+
+def on_web_focus_out(event):
+    if not web_text_area.get("1.0", "end-1c").strip():
+        web_text_area.insert("1.0", strings.get('ui.web_urls.placeholder'))
+        web_text_area.configure(fg='gray')
+
+def add_local_files(paths):
+    """Expand folders in a background thread, then add the files to the local file list."""
+    if not paths:
+        return
+    if any(os.path.isdir(path) for path in paths):
+        update_status(strings.get('ui.local_files.expanding'))
+
+    def expand():
+        files, folder_count = expand_paths(paths, INPUT_EXTENSIONS)
+        root.after(0, lambda: finish_adding_local_files(files, folder_count))
+
+    threading.Thread(target=expand, daemon=True).start()
+
+def finish_adding_local_files(files, folder_count):
+    added = local_files.add(files)
+    local_file_view.refresh()
+    local_summary_label.config(text=strings.get('ui.local_files.summary',
+        total=len(local_files),
+        added=added,
+        folders=folder_count,
+        duplicates=len(files) - added
+    ))
+    update_status("")
+
+def clear_local_files():
+    local_files.clear()
+    local_file_view.refresh()
+    local_summary_label.config(text="")
+
+def handle_drop(event):
+    # Get the dropped files and folders
+    files = event.data
+    if files:
+        # Convert the dropped data to a list of files
+        if isinstance(files, str):
+            files = root.tk.splitlist(files)
+        add_local_files(list(files))
+
+def browse_files():
+    files = filedialog.askopenfilenames(
+        title=strings.get('ui.local_files.dialog_title'),
+        filetypes=[
+            (strings.get('ui.local_files.file_types.media'), " ".join(f"*{ext}" for ext in INPUT_EXTENSIONS + ARCHIVE_EXTENSIONS)),
+            (strings.get('ui.local_files.file_types.images'), " ".join(f"*{ext}" for ext in IMAGE_EXTENSIONS)),
+            (strings.get('ui.local_files.file_types.videos'), " ".join(f"*{ext}" for ext in VIDEO_EXTENSIONS)),
+            (strings.get('ui.local_files.file_types.archives'), " ".join(f"*{ext}" for ext in ARCHIVE_EXTENSIONS)),
+            (strings.get('ui.local_files.file_types.all'), "*.*")
+        ]
+    )
+    if files:
+        add_local_files(list(files))
+
+def update_tier(event=None):
+    from dotenv import set_key
+    set_key(os.path.join(SCRIPT_DIR, '.env'), 'CURRENT_TIER', tier_var.get())
+    save_settings()
+
+def update_prompt(*args):
+    selected = prompt_var.get()
+    for preset in prompts:
+        if preset['title'] == selected:
+            instructions_entry.delete("1.0", tk.END)
+            instructions_entry.insert("1.0", preset['text'])
+            save_settings()
+            break
+
+def toggle_pause():
+    if run_control.is_paused():
+        run_control.resume()
+        pause_button.config(text=strings.get('ui.generate.pause_button'))
+        update_status(strings.get('messages.processing.resumed'))
+    else:
+        run_control.pause()
+        pause_button.config(text=strings.get('ui.generate.resume_button'))
+        update_status(strings.get('messages.processing.paused'))
+
+def cancel_run():
+    run_control.cancel()
+    pause_button.config(state="disabled")
+    cancel_button.config(state="disabled")
+    update_status(strings.get('messages.processing.cancel_requested'))
+
+def set_run_buttons_state(running):
+    state = "normal" if running else "disabled"
+    pause_button.config(text=strings.get('ui.generate.pause_button'), state=state)
+    cancel_button.config(state=state)
+
+# GUI setup
+def build_gui():
+    """Import the GUI toolkit and build the main window."""
+    global tk, ttk, messagebox, filedialog
+    global root, status_label, dashboard_label, progress_var, generate_button, web_text_area, local_file_view, local_summary_label, instructions_entry
+    global pause_button, cancel_button
+    global batch_var, save_individual_var, save_local_var, overwrite_var, resolution_var, tier_var, stream_var
+    global save_local_checkbox, overwrite_checkbox, prompts, prompt_var
+
+    import tkinter as tk
+    from tkinter import messagebox, ttk, filedialog
+    from tkinterdnd2 import DND_FILES, TkinterDnD
+    from file_list_view import VirtualListView
+
+    root = TkinterDnD.Tk()  # Use TkinterDnD.Tk instead of tk.Tk
+    root.title(strings.get('ui.window.title'))
+
+    # Add window closing handler
+    root.protocol("WM_DELETE_WINDOW", on_closing)
+
+    # Main window size, width and height
+    root.geometry("1000x700")
+
+    # Main container with padding
+    main_frame = ttk.Frame(root, padding="10")
+    main_frame.pack(fill=tk.BOTH, expand=True)
+
+    # Web URLs Frame
+    web_frame = ttk.LabelFrame(main_frame, text=strings.get('ui.web_urls.frame_title'), padding="5")
+    web_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
+
+    # Web URLs text area with scrollbar
+    web_scroll = ttk.Scrollbar(web_frame)
+    web_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+
+    web_text_area = tk.Text(web_frame, height=6, yscrollcommand=web_scroll.set)
+    web_text_area.pack(fill=tk.BOTH, expand=True, pady=5)
+    web_text_area.insert("1.0", strings.get('ui.web_urls.placeholder'))
+    web_text_area.configure(fg='gray')
+    web_scroll.config(command=web_text_area.yview)
+
+    web_text_area.bind('<FocusIn>', on_web_focus_in)
+    web_text_area.bind('<FocusOut>', on_web_focus_out)
+
+    # Local Files Frame
+    local_frame = ttk.LabelFrame(main_frame, text=strings.get('ui.local_files.frame_title'), padding="5")
+    local_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
+
+    # Local files list, drawing only the visible rows
+    local_file_view = VirtualListView(local_frame, local_files, placeholder=strings.get('ui.local_files.placeholder'))
+    local_file_view.pack(fill=tk.BOTH, expand=True, pady=5)
+
+    # Enable drag and drop
+    local_file_view.canvas.drop_target_register(DND_FILES)
+    local_file_view.canvas.dnd_bind('<<Drop>>', handle_drop)
+
+    # Local files buttons
+    local_button_frame = ttk.Frame(local_frame)
+    local_button_frame.pack(fill=tk.X)
+
+    ttk.Button(
+        local_button_frame,
+        text=strings.get('ui.local_files.browse_button'),
+        command=browse_files
+    ).pack(side=tk.LEFT, padx=5)
+
+    ttk.Button(
+        local_button_frame,
+        text=strings.get('ui.local_files.clear_button'),
+        command=clear_local_files
+    ).pack(side=tk.LEFT)
+
+    local_summary_label = ttk.Label(local_button_frame, text="")
+    local_summary_label.pack(side=tk.LEFT, padx=10)
+
+    # Processing Options Frame
+    options_frame = ttk.LabelFrame(main_frame, text=strings.get('ui.options.frame_title'), padding="5")
+    options_frame.pack(fill=tk.X, pady=(0, 10))
+
+    # Left side options (Save options)
+    left_options = ttk.Frame(options_frame)
+    left_options.pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+    # Save options
+    save_individual_var = tk.BooleanVar(value=True)
+    save_individual_checkbox = ttk.Checkbutton(
+        left_options,
+        text=strings.get('ui.options.save_individual.text'),
+        variable=save_individual_var,
+        command=update_save_options
+    )
+    CreateToolTip(save_individual_checkbox, strings.get('ui.options.save_individual.tooltip'))
+    save_individual_checkbox.pack(side=tk.LEFT, padx=5)
+
+    save_local_var = tk.BooleanVar(value=False)
+    save_local_checkbox = ttk.Checkbutton(
+        left_options,
+        text=strings.get('ui.options.save_local.text'),
+        variable=save_local_var,
+        command=update_save_options
+    )
+    CreateToolTip(save_local_checkbox, strings.get('ui.options.save_local.tooltip'))
+    save_local_checkbox.pack(side=tk.LEFT, padx=5)
+
+    overwrite_var = tk.BooleanVar(value=True)
+    overwrite_checkbox = ttk.Checkbutton(
+        left_options,
+        text=strings.get('ui.options.overwrite.text'),
+        variable=overwrite_var,
+        command=update_save_options
+    )
+    CreateToolTip(overwrite_checkbox, strings.get('ui.options.overwrite.tooltip'))
+    overwrite_checkbox.pack(side=tk.LEFT, padx=5)
+
+    # Right side options (Batch Processing and Tier selection)
+    right_options = ttk.Frame(options_frame)
+    right_options.pack(side=tk.RIGHT, fill=tk.X)
+
+    # Resolution dropdown
+    resolution_var = tk.StringVar(value="1024")
+    resolution_label = ttk.Label(right_options, text=strings.get('ui.options.resolution.label'))
+    resolution_label.pack(side=tk.LEFT, padx=(5, 0))
+    CreateToolTip(resolution_label, strings.get('ui.options.resolution.tooltip'))
+
+    resolution_dropdown = ttk.Combobox(
+        right_options,
+        textvariable=resolution_var,
+        values=["512", "1024", "2048"],
+        state="readonly",
+        width=6
+    )
+    CreateToolTip(resolution_dropdown, strings.get('ui.options.resolution.tooltip'))
+    resolution_dropdown.pack(side=tk.LEFT, padx=5)
+    resolution_dropdown.bind('<<ComboboxSelected>>', lambda e: save_settings())
+
+    # Batch processing toggle
+    batch_var = tk.BooleanVar(value=False)
+    batch_checkbox = ttk.Checkbutton(
+        right_options,
+        text=strings.get('ui.options.batch.text'),
+        variable=batch_var,
+        command=save_settings
+    )
+    CreateToolTip(batch_checkbox, strings.get('ui.options.batch.tooltip'))
+    batch_checkbox.pack(side=tk.LEFT, padx=5)
+
+    # Streaming toggle
+    stream_var = tk.BooleanVar(value=False)
+    stream_checkbox = ttk.Checkbutton(
+        right_options,
+        text=strings.get('ui.options.stream.text'),
+        variable=stream_var,
+        command=save_settings
+    )
+    CreateToolTip(stream_checkbox, strings.get('ui.options.stream.tooltip'))
+    stream_checkbox.pack(side=tk.LEFT, padx=5)
+
+    # Get current tier and available tiers
+    current_tier, tiers = get_rate_limits()
+    tier_var = tk.StringVar(value=current_tier)
+
+    tier_label = ttk.Label(right_options, text=strings.get('ui.options.tier.label'))
+    tier_label.pack(side=tk.LEFT, padx=(10, 0))
+    CreateToolTip(tier_label, strings.get('ui.options.tier.tooltip'))
+
+    tier_dropdown = ttk.Combobox(
+        right_options,
+        textvariable=tier_var,
+        values=list(tiers.keys()),
+        state="readonly",
+        width=10
+    )
+    tier_dropdown.pack(side=tk.LEFT, padx=5)
+    CreateToolTip(tier_dropdown, strings.get('ui.options.tier.tooltip'))
+
+    tier_dropdown.bind('<<ComboboxSelected>>', update_tier)
+
+    # Instructions Frame
+    instructions_frame = ttk.LabelFrame(main_frame, text=strings.get('ui.instructions.frame_title'), padding="5")
+    instructions_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
+
+    # Prompt Library Dropdown
+    prompts = load_prompts()
+    prompt_var = tk.StringVar(value=strings.get('ui.instructions.prompt_default'))
+
+    prompt_dropdown = ttk.Combobox(
+        instructions_frame,
+        textvariable=prompt_var,
+        values=[preset['title'] for preset in prompts],
+        state="readonly",
+        width=40
+    )
+    prompt_dropdown.pack(fill=tk.X, pady=(0, 5))
+    prompt_dropdown.bind('<<ComboboxSelected>>', update_prompt)
+
+    instructions_scroll = ttk.Scrollbar(instructions_frame)
+    instructions_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+
+    instructions_entry = tk.Text(instructions_frame, height=6, yscrollcommand=instructions_scroll.set)
+    instructions_entry.pack(fill=tk.BOTH, expand=True, pady=5)
+    instructions_scroll.config(command=instructions_entry.yview)
+
+    # Generate button frame
+    button_frame = ttk.Frame(main_frame)
+    button_frame.pack(fill=tk.X, pady=(0, 10))
+
+    # Generate button with increased height
+    style = ttk.Style()
+    style.configure('Tall.TButton', padding=10)
+    generate_button = ttk.Button(
+        button_frame,
+        text=strings.get('ui.generate.button_text'),
+        command=generate_captions,
+        style='Tall.TButton'
+    )
+    generate_button.pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+    # Pause and cancel buttons, enabled while a run is in progress
+    pause_button = ttk.Button(
+        button_frame,
+        text=strings.get('ui.generate.pause_button'),
+        command=toggle_pause,
+        style='Tall.TButton',
+        state="disabled"
+    )
+    pause_button.pack(side=tk.LEFT, padx=(5, 0))
+
+    cancel_button = ttk.Button(
+        button_frame,
+        text=strings.get('ui.generate.cancel_button'),
+        command=cancel_run,
+        style='Tall.TButton',
+        state="disabled"
+    )
+    cancel_button.pack(side=tk.LEFT, padx=(5, 0))
+
+    # Status frame with progress bar
+    status_frame = ttk.Frame(main_frame)
+    status_frame.pack(fill=tk.X, pady=(0, 10))
+
+    # Progress bar
+    progress_var = tk.DoubleVar()
+    progress_bar = ttk.Progressbar(
+        status_frame,
+        variable=progress_var,
+        maximum=100,
+        mode='determinate'
+    )
+    progress_bar.pack(fill=tk.X, pady=(0, 5))
+
+    # Status label
+    status_label = ttk.Label(status_frame, text="")
+    status_label.pack(fill=tk.X)
+
+    # Live throughput, ETA and spend
+    dashboard_label = ttk.Label(status_frame, text="")
+    dashboard_label.pack(fill=tk.X)
+
+    # Load settings after all UI elements are created
+    load_settings()
+
+# Headless mode
+class HeadlessVar(object):
+    """Stand-in for a Tk variable when running without the GUI."""
+    def __init__(self, value=None):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+def init_headless_settings():
+    """Initialize the setting variables from the .env file without building the GUI."""
+    global batch_var, save_individual_var, save_local_var, overwrite_var, resolution_var, tier_var, stream_var
+    batch_var = HeadlessVar(os.getenv('BATCH_PROCESSING_ENABLED', 'false').lower() == 'true')
+    save_individual_var = HeadlessVar(os.getenv('SAVE_INDIVIDUAL_ENABLED', 'true').lower() == 'true')
+    save_local_var = HeadlessVar(save_individual_var.get() and os.getenv('SAVE_LOCAL_IN_PLACE', 'false').lower() == 'true')
+    overwrite_var = HeadlessVar(os.getenv('OVERWRITE_FILES', 'true').lower() == 'true')
+    resolution_var = HeadlessVar(os.getenv('MAX_RESOLUTION', '1024'))
+    tier_var = HeadlessVar(os.getenv('CURRENT_TIER', 'Free'))
+    stream_var = HeadlessVar(os.getenv('STREAMING_ENABLED', 'false').lower() == 'true')
+
+def get_output_folder():
+    """Create the dated output folder path for a new run."""
+    global time_folder
+    date_folder = datetime.datetime.now().strftime('%Y-%m-%d')
+    time_folder = datetime.datetime.now().strftime('%Y-%m-%d - %H.%M.%S')
+
+    # Get the root directory (parent of scripts)
+    root_dir = os.path.dirname(SCRIPT_DIR)
+    return os.path.join(root_dir, 'output', date_folder, time_folder)
+
+def get_headless_prompt(args):
+    """Resolve the prompt for a headless run from the arguments or the last used prompt."""
+    if args.prompt:
+        return args.prompt
+    if args.preset:
+        for preset in prompts:
+            if preset['title'] == args.preset:
+                return preset['text']
+        raise SystemExit(strings.get('messages.console.headless.unknown_preset', preset=args.preset))
+    return os.getenv('LAST_USED_PROMPT', '')
+
+def install_signal_handlers():
+    """
+    Control a headless run with signals: Ctrl+C or SIGTERM cancels it (a second
+    Ctrl+C stops immediately), SIGUSR1 pauses and SIGUSR2 resumes it. On Windows,
+    Ctrl+Break toggles pause.
+    """
+    import signal
+
+    def on_cancel(signum, frame):
+        if run_control.is_cancelled():
+            raise KeyboardInterrupt
+        print(strings.get('messages.processing.cancel_requested'))
+        run_control.cancel()
+
+    def on_pause(signum, frame):
+        print(strings.get('messages.processing.paused'))
+        run_control.pause()
+
+    def on_resume(signum, frame):
+        print(strings.get('messages.processing.resumed'))
+        run_control.resume()
+
+    def on_toggle_pause(signum, frame):
+        if run_control.is_paused():
+            on_resume(signum, frame)
+        else:
+            on_pause(signum, frame)
+
+    signal.signal(signal.SIGINT, on_cancel)
+    signal.signal(signal.SIGTERM, on_cancel)
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, on_pause)
+        signal.signal(signal.SIGUSR2, on_resume)
+    if hasattr(signal, 'SIGBREAK'):
+        signal.signal(signal.SIGBREAK, on_toggle_pause)
+
+def run_headless(args):
+    """Validate, estimate and optionally caption the given inputs without the GUI."""
+    global total_images, processed_images, prompts
+    init_headless_settings()
+    prompts = load_prompts()
+
+    web_urls = [path for path in args.inputs if is_url(path)]
+    local_paths, _ = expand_paths([path for path in args.inputs if not is_url(path)], INPUT_EXTENSIONS)
+    all_images = web_urls + local_paths
+    if not all_images:
+        print(strings.get('messages.validation.no_images'))
+        return 1
+
+    instruction_text = get_headless_prompt(args)
+    validation = validate_images(all_images, instruction_text)
+    if not validation['to_process']:
+        print(strings.get('messages.validation.no_valid_images'))
+        return 1
+
+    cost, tokens_saved = estimate_cost(len(validation['to_process']), instruction_text, validation['to_process'])
+    if tokens_saved:
+        print(strings.get('messages.validation.tokens_saved',
+            tokens=tokens_saved,
+            cost="{:.4f}".format(tokens_saved * TOKEN_COST_INPUT)
+        ).strip())
+    print(strings.get('messages.console.headless.estimate',
+        count=len(validation['to_process']),
+        cost="{:.4f}".format(cost)
+    ))
+    requests_left = get_daily_requests_left(get_api_keys())
+    if requests_left is not None and requests_left < len(validation['to_process']):
+        print(strings.get('messages.validation.daily_limit', left=requests_left).strip())
+
+    if args.estimate:
+        return 0
+
+    if not args.yes:
+        answer = input(strings.get('messages.console.headless.confirm'))
+        if answer.strip().lower() not in ('y', 'yes'):
+            print(strings.get('messages.processing.cancelled'))
+            return 1
+
+    print(strings.get('messages.processing.start', count=len(validation['to_process'])))
+    install_signal_handlers()
+    total_images = len(validation['to_process'])
+    processed_images = 0
+    process_images(
+        validation['to_process'],
+        instruction_text,
+        get_output_folder(),
+        batch_var.get(),
+        stream=stream_var.get(),
+        estimated_cost=cost
+    )
+    if run_control.is_cancelled():
+        print(strings.get('messages.processing.run_cancelled'))
+        return 1
+    print(strings.get('messages.processing.complete'))
+    return 0
+
+def parse_args(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description=strings.get('messages.console.headless.description'),
+        fromfile_prefix_chars='@'
+    )
+    parser.add_argument('inputs', nargs='*', help=strings.get('messages.console.headless.help.inputs'))
+    parser.add_argument('--headless', action='store_true', help=strings.get('messages.console.headless.help.headless'))
+    parser.add_argument('--estimate', action='store_true', help=strings.get('messages.console.headless.help.estimate'))
+    parser.add_argument('--prompt', help=strings.get('messages.console.headless.help.prompt'))
+    parser.add_argument('--preset', help=strings.get('messages.console.headless.help.preset'))
+    parser.add_argument('-y', '--yes', action='store_true', help=strings.get('messages.console.headless.help.yes'))
+    parser.add_argument('--status-file', help=strings.get('messages.console.headless.help.status_file'))
+    parser.add_argument('--max-cost', type=float, help=strings.get('messages.console.headless.help.max_cost'))
+    parser.add_argument('--max-run-tokens', type=int, help=strings.get('messages.console.headless.help.max_run_tokens'))
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    global STATUS_FILE, MAX_RUN_COST, MAX_RUN_TOKENS
+    args = parse_args(argv)
+    load_environment()
+    if args.status_file:
+        STATUS_FILE = args.status_file
+    if args.max_cost is not None:
+        MAX_RUN_COST = args.max_cost
+    if args.max_run_tokens is not None:
+        MAX_RUN_TOKENS = args.max_run_tokens
+
+    if args.headless or args.estimate:
+        return run_headless(args)
+
+    build_gui()
+    root.mainloop()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import time
+import threading
+from collections import deque
+from typing import Callable, List, Optional
+from quota_ledger import key_id
+
+
+class PoolExhausted(Exception):
+    """Raised when every key of the pool is quarantined or used up its requests for the day."""
+
+
+class ApiKey:
+    """
+    One API key with its tier limits, the requests and tokens it used in the
+    last minute, and the requests it used today across all processes.
+    """
+
+    def __init__(self, name: str, api_key: str, tier: str, rpm: int, tpm: int, rpd: int = 0):
+        self.name = name
+        self.api_key = api_key
+        self.key_id = key_id(api_key)
+        self.tier = tier
+        self.rpm = rpm
+        self.tpm = tpm
+        self.rpd = rpd
+        self.requests_today = 0
+        self.window = deque()  # (timestamp, tokens) of the requests of the last minute
+        self.window_tokens = 0
+        self.in_flight = 0
+        self.in_flight_tokens = 0
+        self.header_headroom = 1.0
+        self.quarantined_until = 0.0
+        self.requests = 0
+        self.tokens = 0
+        self.errors = 0
+
+    def trim(self, now: float):
+        while self.window and now - self.window[0][0] > 60:
+            self.window_tokens -= self.window.popleft()[1]
+
+    def out_of_daily_requests(self) -> bool:
+        return self.rpd > 0 and self.requests_today + self.in_flight >= self.rpd
+
+    def headroom(self, tokens: int) -> float:
+        """Share of the key's per minute limits left after a request of the given size."""
+        request_share = 1.0
+        token_share = 1.0
+        if self.rpm > 0:
+            request_share = 1 - (len(self.window) + self.in_flight + 1) / self.rpm
+        if self.tpm > 0:
+            token_share = 1 - (self.window_tokens + self.in_flight_tokens + tokens) / self.tpm
+        return min(request_share, token_share, self.header_headroom)
+
+
+class KeyPool:
+    """
+    Spread requests over several API keys. Each request goes to the key with
+    the most headroom under its own RPM and TPM limits, tracked over a sliding
+    minute and corrected by the x-ratelimit-* headers of its responses. Keys
+    that fail authentication or run out of quota are quarantined for the rest
+    of the run, and rate limited keys for a short cooldown. With a quota ledger,
+    requests are counted per key per day across runs and processes, and a key
+    that reached its daily request limit gets no more requests.
+    """
+
+    def __init__(self, keys: List[ApiKey], cooldown: float = 10.0, clock: Callable[[], float] = time.monotonic,
+                 ledger=None, sync_interval: float = 5.0):
+        self.keys = keys
+        self.cooldown = cooldown
+        self.clock = clock
+        self.ledger = ledger
+        self.sync_interval = sync_interval
+        self._last_sync = None
+        self._condition = threading.Condition()
+
+    def _sync_daily_usage(self, now: float):
+        # Pick up the requests other processes sent today
+        if self.ledger is None or (self._last_sync is not None and now - self._last_sync < self.sync_interval):
+            return
+        self._last_sync = now
+        for key in self.keys:
+            key.requests_today = self.ledger.usage_today(key.key_id).requests
+
+    @property
+    def total_rpm(self) -> int:
+        return sum(key.rpm for key in self.keys)
+
+    @property
+    def total_tpm(self) -> int:
+        return sum(key.tpm for key in self.keys)
+
+    def acquire(self, tokens: int, timeout: Optional[float] = None) -> ApiKey:
+        """
+        Reserve a request of about the given number of tokens on the key with the
+        most headroom, waiting while every key is at its limits. Raises
+        PoolExhausted if all keys are quarantined for good.
+        """
+        deadline = None if timeout is None else self.clock() + timeout
+        with self._condition:
+            while True:
+                now = self.clock()
+                self._sync_daily_usage(now)
+                usable = [key for key in self.keys if key.quarantined_until != float('inf') and not (
+                    key.out_of_daily_requests() and key.in_flight == 0)]
+                if not usable:
+                    raise PoolExhausted()
+                available = [
+                    key for key in usable if key.quarantined_until <= now and not key.out_of_daily_requests()
+                ]
+
+                for key in available:
+                    key.trim(now)
+                best = max(available, key=lambda key: key.headroom(tokens), default=None)
+                # A key with nothing in flight always gets a request, so one large request cannot stall the run
+                if best is not None and (best.headroom(tokens) >= 0 or best.in_flight == 0 and not best.window):
+                    best.in_flight += 1
+                    best.in_flight_tokens += tokens
+                    best.requests += 1
+                    return best
+
+                if deadline is not None and now >= deadline:
+                    raise TimeoutError()
+                self._condition.wait(1.0)
+
+    def release(self, key: ApiKey, reserved_tokens: int, used_tokens: int):
+        """Record the tokens a request used once it finished, and count it for the day."""
+        with self._condition:
+            key.in_flight = max(0, key.in_flight - 1)
+            key.in_flight_tokens = max(0, key.in_flight_tokens - reserved_tokens)
+            key.window.append((self.clock(), used_tokens))
+            key.window_tokens += used_tokens
+            key.tokens += used_tokens
+            key.requests_today += 1
+            self._condition.notify_all()
+        if self.ledger is not None:
+            self.ledger.add(key.key_id, requests=1)
+
+    def record_headers(self, key: ApiKey, headers):
+        """Read the x-ratelimit-* headers of a response to the key."""
+        headroom = []
+        for kind in ('requests', 'tokens'):
+            try:
+                remaining = float(headers.get(f'x-ratelimit-remaining-{kind}'))
+                limit = float(headers.get(f'x-ratelimit-limit-{kind}'))
+            except (TypeError, ValueError):
+                continue
+            if limit > 0:
+                headroom.append(remaining / limit)
+        if headroom:
+            with self._condition:
+                key.header_headroom = min(headroom)
+
+    def quarantine(self, key: ApiKey, permanent: bool = False, seconds: Optional[float] = None) -> bool:
+        """
+        Stop sending requests to a key, for the rest of the run or for a cooldown.
+        Returns whether the key was newly quarantined for good.
+        """
+        with self._condition:
+            key.errors += 1
+            if permanent:
+                newly_disabled = key.quarantined_until != float('inf')
+                key.quarantined_until = float('inf')
+                self._condition.notify_all()
+                return newly_disabled
+            else:
+                key.quarantined_until = max(key.quarantined_until, self.clock() + (seconds or self.cooldown))
+                # Start from a clean slate after the cooldown
+                key.header_headroom = 1.0
+            self._condition.notify_all()
+            return False
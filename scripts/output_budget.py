@@ -0,0 +1,69 @@
+import os
+import json
+import math
+import threading
+from typing import Dict, List
+from output_layout import write_text_atomic
+
+
+class OutputBudgets:
+    """
+    Learn the max_tokens to request for each prompt from the caption lengths
+    seen in earlier runs. The budget is a high percentile of the recent lengths
+    plus a margin, so short keyword prompts stop reserving output they never
+    use and long descriptions are no longer cut off. Prompts with too few
+    captions so far use the default.
+    """
+
+    def __init__(self, path: str, default: int = 300, minimum: int = 32, maximum: int = 1024,
+                 percentile: float = 0.99, margin: float = 1.25, min_samples: int = 20, window: int = 500):
+        self.path = path
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.percentile = percentile
+        self.margin = margin
+        self.min_samples = min_samples
+        self.window = window
+        self.lengths: Dict[str, List[int]] = {}
+        self._budgets: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.lengths = {key: list(values) for key, values in json.load(f).items()}
+        except (OSError, ValueError, AttributeError):
+            self.lengths = {}
+
+    def save(self):
+        with self._lock:
+            data = json.dumps(self.lengths)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        write_text_atomic(self.path, data)
+
+    def budget_for(self, prompt_hash: str) -> int:
+        """The max_tokens to request for a prompt."""
+        with self._lock:
+            if prompt_hash not in self._budgets:
+                lengths = sorted(self.lengths.get(prompt_hash, ()))
+                if len(lengths) < self.min_samples:
+                    budget = self.default
+                else:
+                    high = lengths[min(len(lengths) - 1, int(len(lengths) * self.percentile))]
+                    budget = min(self.maximum, max(self.minimum, math.ceil(high * self.margin)))
+                self._budgets[prompt_hash] = budget
+            return self._budgets[prompt_hash]
+
+    def record(self, prompt_hash: str, completion_tokens: int, truncated: bool = False):
+        """
+        Record the length of a caption. The full length of a truncated caption is
+        unknown, so it counts as twice the length it was cut at.
+        """
+        with self._lock:
+            lengths = self.lengths.setdefault(prompt_hash, [])
+            lengths.append(completion_tokens * 2 if truncated else completion_tokens)
+            del lengths[:-self.window]
+            # The budget is recomputed from the new lengths on the next lookup
+            self._budgets.pop(prompt_hash, None)
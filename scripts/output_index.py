@@ -0,0 +1,112 @@
+import os
+import json
+import hashlib
+import zipfile
+import threading
+from typing import Dict, Optional, Set, Tuple
+from archive_inputs import MEMBER_SEPARATOR
+
+
+def hash_prompt(instruction_text: str) -> str:
+    """Short stable hash of a prompt, used to tell captions of different prompts apart."""
+    return hashlib.sha1(instruction_text.strip().encode('utf-8')).hexdigest()[:16]
+
+
+class OutputIndex:
+    """
+    Persistent index of inputs that already have a caption.
+
+    Entries are keyed by (path, mtime, size, prompt hash) and map to the caption
+    file that was written. The index is an append-only JSON lines file that is
+    read once into memory, so a lookup is a dictionary access and a check
+    that the caption still exists, so deleted captions are generated again.
+    """
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self.entries: Dict[Tuple, str] = {}
+        self._zip_members: Dict[Tuple[str, int], Set[str]] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def make_key(path: str, instruction_text: str, stat_result: Optional[os.stat_result] = None) -> Tuple:
+        """Build the index key for an input. Local files need their stat result."""
+        prompt_hash = hash_prompt(instruction_text)
+        if stat_result is None:
+            return (path, 0, 0, prompt_hash)
+        return (os.path.abspath(path), stat_result.st_mtime_ns, stat_result.st_size, prompt_hash)
+
+    def load(self):
+        """Read the index file, compacting it when it holds many superseded lines."""
+        self.entries = {}
+        if not os.path.exists(self.index_path):
+            return
+
+        line_count = 0
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    key = (entry['path'], entry['mtime'], entry['size'], entry['prompt'])
+                    self.entries[key] = entry['output']
+                    line_count += 1
+                except (ValueError, KeyError):
+                    # Skip lines cut short by an interrupted run
+                    continue
+
+        if line_count > 2 * len(self.entries) + 1000:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the index file with only the current entries."""
+        with self._lock:
+            temp_path = self.index_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for key, output in self.entries.items():
+                    f.write(self._format_entry(key, output))
+            os.replace(temp_path, self.index_path)
+
+    def lookup(self, key: Tuple) -> Optional[str]:
+        """Return the caption file recorded for the key, or None if there is none or it was deleted."""
+        output_path = self.entries.get(key)
+        if output_path is None or not self._output_exists(output_path):
+            return None
+        return output_path
+
+    def _output_exists(self, output_path: str) -> bool:
+        if MEMBER_SEPARATOR not in output_path:
+            return os.path.exists(output_path)
+        # Captions added to a zip archive; its member names are read again only when the archive changes
+        zip_path, name = output_path.split(MEMBER_SEPARATOR, 1)
+        try:
+            version = (zip_path, os.stat(zip_path).st_mtime_ns)
+        except OSError:
+            return False
+        with self._lock:
+            if version not in self._zip_members:
+                try:
+                    with zipfile.ZipFile(zip_path) as archive:
+                        self._zip_members[version] = set(archive.namelist())
+                except (OSError, zipfile.BadZipFile):
+                    self._zip_members[version] = set()
+            return name in self._zip_members[version]
+
+    def record(self, key: Tuple, output_path: str):
+        """Remember that the input described by key was captioned to output_path."""
+        with self._lock:
+            self.entries[key] = output_path
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(self._format_entry(key, output_path))
+
+    @staticmethod
+    def _format_entry(key: Tuple, output_path: str) -> str:
+        path, mtime, size, prompt_hash = key
+        return json.dumps({
+            'path': path,
+            'mtime': mtime,
+            'size': size,
+            'prompt': prompt_hash,
+            'output': output_path
+        }) + '\n'
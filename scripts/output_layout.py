@@ -0,0 +1,80 @@
+import os
+import hashlib
+import threading
+import urllib.parse
+from typing import Dict, List
+from archive_inputs import is_archive_member, split_member
+
+# Ways to arrange caption files in the output folder of a run
+OUTPUT_LAYOUTS = ('flat', 'sharded', 'mirror')
+
+
+def write_text_atomic(path: str, text: str):
+    """Write a text file through a temporary file and a rename, so a partial file never appears."""
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _hash(source: str) -> str:
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+
+def _safe_parts(parts: List[str]) -> List[str]:
+    # Drop empty and relative parts so a mirrored path stays inside the output folder
+    return [part.replace(':', '_') for part in parts if part not in ('', '.', '..')]
+
+
+def _mirror_parts(source: str) -> List[str]:
+    """The folders of an input, as a list of path parts to recreate in the output."""
+    if '://' in source:
+        url = urllib.parse.urlsplit(source)
+        return _safe_parts([url.netloc] + urllib.parse.unquote(url.path).split('/')[:-1])
+    if is_archive_member(source):
+        # Archive members mirror the archive path followed by the folders inside it
+        archive_path, member = split_member(source)
+        return _mirror_parts(archive_path) + [os.path.basename(archive_path)] + _safe_parts(member.split('/')[:-1])
+    drive, folder = os.path.splitdrive(os.path.dirname(os.path.abspath(source)))
+    return _safe_parts([drive.strip('\\/').replace('\\', '_').replace(':', '')] + folder.replace('\\', '/').split('/'))
+
+
+class OutputLayout:
+    """
+    Decide where the caption of each input goes in the output folder of a run.
+
+    The flat layout puts every caption in the folder itself, sharded spreads them
+    over 256 subfolders by a hash of the input, and mirror recreates the folders
+    of the input paths and URLs. Whatever the layout, a caption file name that
+    was already used by another input in the run gets a short hash of the input
+    appended, so captions never overwrite each other.
+    """
+
+    def __init__(self, root: str, layout: str = 'flat'):
+        self.root = root
+        self.layout = layout if layout in OUTPUT_LAYOUTS else 'flat'
+        self._claimed: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, source: str, filename: str) -> str:
+        """Return the caption path for an input and reserve it for that input."""
+        if self.layout == 'sharded':
+            folder = os.path.join(self.root, _hash(source)[:2])
+        elif self.layout == 'mirror':
+            folder = os.path.join(self.root, *_mirror_parts(source))
+        else:
+            folder = self.root
+
+        path = os.path.join(folder, f'{filename}.txt')
+        with self._lock:
+            if self._claimed.setdefault(path, source) != source:
+                path = os.path.join(folder, f'{filename}_{_hash(source)[:8]}.txt')
+                self._claimed[path] = source
+        return path
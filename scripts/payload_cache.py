@@ -0,0 +1,152 @@
+import os
+import json
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+from output_layout import write_text_atomic
+
+# Each record in the pack file: magic, SHA-1 of its key and data length, then the data
+RECORD_HEADER = struct.Struct('<4s20sI')
+RECORD_MAGIC = b'GPC1'
+
+
+class PayloadCache:
+    """
+    Encoded images kept on disk between runs, so captioning the same folder
+    again (with another prompt, for example) skips decoding, resizing and
+    encoding. The JPEG data is appended to a pack file and an index maps each
+    key to its offset, in least recently used order. Once the data passes
+    max_bytes, the least recently used images are dropped from the index, and
+    the pack file is rewritten without them when the cache is saved, or as
+    soon as the pack file grows past twice max_bytes during a run. Every
+    record carries the hash of its key, so a record rewritten by another
+    process is never mistaken for the image asked for.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.pack_path = os.path.join(directory, 'payloads.pack')
+        self.index_path = os.path.join(directory, 'payloads.index.json')
+        self.max_bytes = max_bytes
+        # Key -> [offset, length, original width, original height, sent width, sent height]
+        self.index: OrderedDict = OrderedDict()
+        self.live_bytes = 0
+        self.pack_size = 0
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.load()
+
+    @staticmethod
+    def make_key(path: str, stat_result, *settings) -> str:
+        """Build the key of an image from its path, modification time, size and the settings it was encoded with."""
+        identity = [os.path.abspath(path), stat_result.st_mtime_ns, stat_result.st_size] + list(settings)
+        return hashlib.sha1(json.dumps(identity).encode('utf-8')).hexdigest()
+
+    def load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            pack_size = os.path.getsize(self.pack_path)
+        except (OSError, ValueError):
+            entries = []
+            pack_size = 0
+        self.index = OrderedDict(
+            (key, entry) for key, entry in entries
+            if entry[0] + RECORD_HEADER.size + entry[1] <= pack_size
+        )
+        self.live_bytes = sum(entry[1] for entry in self.index.values())
+        self.pack_size = pack_size
+
+    def get(self, key: str) -> Optional[Tuple[bytes, Tuple[int, int], Tuple[int, int]]]:
+        """Return the encoded image with its original and sent size, or None."""
+        with self._lock:
+            entry = self.index.get(key)
+            if entry is not None:
+                offset, length = entry[0], entry[1]
+                try:
+                    with open(self.pack_path, 'rb') as f:
+                        f.seek(offset)
+                        header = f.read(RECORD_HEADER.size)
+                        data = f.read(length)
+                    magic, key_hash, stored_length = RECORD_HEADER.unpack(header)
+                    valid = magic == RECORD_MAGIC and key_hash == bytes.fromhex(key) and stored_length == len(data)
+                except (OSError, struct.error):
+                    valid = False
+                if valid:
+                    self.index.move_to_end(key)
+                    self.hits += 1
+                    return data, (entry[2], entry[3]), (entry[4], entry[5])
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def put(self, key: str, data: bytes, original_size: Tuple[int, int], sent_size: Tuple[int, int]):
+        """Append an encoded image, dropping the least recently used ones beyond max_bytes."""
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            try:
+                with open(self.pack_path, 'ab') as f:
+                    offset = f.seek(0, os.SEEK_END)
+                    f.write(RECORD_HEADER.pack(RECORD_MAGIC, bytes.fromhex(key), len(data)) + data)
+            except OSError:
+                return
+            self.pack_size = offset + RECORD_HEADER.size + len(data)
+            self._drop(key)
+            self.index[key] = [offset, len(data), original_size[0], original_size[1], sent_size[0], sent_size[1]]
+            self.live_bytes += len(data)
+            self.stored += 1
+            while self.live_bytes > self.max_bytes:
+                self._drop(next(iter(self.index)))
+            # Dropped images still take space in the pack file until it is rewritten
+            if self.pack_size > 2 * self.max_bytes:
+                self._compact()
+
+    def reset_stats(self):
+        self.hits = self.misses = self.stored = 0
+
+    def _drop(self, key: str):
+        entry = self.index.pop(key, None)
+        if entry is not None:
+            self.live_bytes -= entry[1]
+
+    def save(self):
+        """Write the index, first rewriting the pack file if it is over the limit and mostly dropped images."""
+        with self._lock:
+            try:
+                pack_size = os.path.getsize(self.pack_path)
+            except OSError:
+                pack_size = 0
+            live_size = self.live_bytes + len(self.index) * RECORD_HEADER.size
+            if pack_size > self.max_bytes and pack_size > 2 * live_size:
+                self._compact()
+            data = json.dumps(list(self.index.items()))
+        write_text_atomic(self.index_path, data)
+
+    def _compact(self):
+        # Copy the live records, oldest first, into a new pack file
+        temp_path = f'{self.pack_path}.{os.getpid()}.tmp'
+        compacted = OrderedDict()
+        try:
+            with open(self.pack_path, 'rb') as source, open(temp_path, 'wb') as target:
+                for key, entry in self.index.items():
+                    source.seek(entry[0])
+                    record = source.read(RECORD_HEADER.size + entry[1])
+                    if len(record) != RECORD_HEADER.size + entry[1]:
+                        continue
+                    compacted[key] = [target.tell()] + entry[1:]
+                    target.write(record)
+            os.replace(temp_path, self.pack_path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+        self.index = compacted
+        self.live_bytes = sum(entry[1] for entry in compacted.values())
+        self.pack_size = self.live_bytes + len(compacted) * RECORD_HEADER.size
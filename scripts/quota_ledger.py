@@ -0,0 +1,116 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import namedtuple
+from typing import Dict, Optional, Tuple
+
+# Usage of one key, or of all keys, on one day
+DailyUsage = namedtuple('DailyUsage', ['requests', 'prompt_tokens', 'completion_tokens', 'cost'])
+
+
+def key_id(api_key: Optional[str]) -> str:
+    """Identify an API key in the ledger by a short hash, so the key itself is never stored."""
+    if not api_key:
+        return 'default'
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+
+def today() -> str:
+    """The current day in UTC, when the API's daily limits reset."""
+    return time.strftime('%Y-%m-%d', time.gmtime())
+
+
+class QuotaLedger:
+    """
+    Requests, tokens and cost per API key per day, kept in a SQLite database
+    shared by every run and every process. SQLite's file locks serialise the
+    writers, and the default journal mode keeps the ledger usable on network
+    drives. Usage is added in memory and written in one transaction every
+    flush_interval seconds, so a busy run does not write once per request.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 2.0, clock=time.monotonic):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self._pending: Dict[Tuple[str, str], list] = {}
+        self._last_flush = clock()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS usage ('
+            'day TEXT NOT NULL, key TEXT NOT NULL, requests INTEGER NOT NULL DEFAULT 0, '
+            'prompt_tokens INTEGER NOT NULL DEFAULT 0, completion_tokens INTEGER NOT NULL DEFAULT 0, '
+            'cost REAL NOT NULL DEFAULT 0, PRIMARY KEY (day, key))'
+        )
+
+    def add(self, key: str, requests: int = 0, prompt_tokens: int = 0, completion_tokens: int = 0, cost: float = 0.0):
+        """Add usage of a key to today's row."""
+        with self._lock:
+            row = self._pending.setdefault((today(), key), [0, 0, 0, 0.0])
+            row[0] += requests
+            row[1] += prompt_tokens
+            row[2] += completion_tokens
+            row[3] += cost
+            due = self.clock() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write the usage added since the last flush."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = self.clock()
+            if not pending:
+                return
+            try:
+                self._connection.execute('BEGIN IMMEDIATE')
+                self._connection.executemany(
+                    'INSERT INTO usage (day, key, requests, prompt_tokens, completion_tokens, cost) '
+                    'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (day, key) DO UPDATE SET '
+                    'requests = requests + excluded.requests, '
+                    'prompt_tokens = prompt_tokens + excluded.prompt_tokens, '
+                    'completion_tokens = completion_tokens + excluded.completion_tokens, '
+                    'cost = cost + excluded.cost',
+                    [(day, key) + tuple(row) for (day, key), row in pending.items()]
+                )
+                self._connection.execute('COMMIT')
+            except sqlite3.Error:
+                if self._connection.in_transaction:
+                    self._connection.execute('ROLLBACK')
+                # Keep the usage for the next flush
+                for entry, row in pending.items():
+                    merged = self._pending.setdefault(entry, [0, 0, 0, 0.0])
+                    for i, value in enumerate(row):
+                        merged[i] += value
+
+    def usage_today(self, key: Optional[str] = None) -> DailyUsage:
+        """Today's usage of a key, or of all keys, by every process, including usage not written yet."""
+        day = today()
+        with self._lock:
+            if key is None:
+                row = self._connection.execute(
+                    'SELECT COALESCE(SUM(requests), 0), COALESCE(SUM(prompt_tokens), 0), '
+                    'COALESCE(SUM(completion_tokens), 0), COALESCE(SUM(cost), 0) FROM usage WHERE day = ?',
+                    (day,)
+                ).fetchone()
+                pending = [value for (pending_day, _), value in self._pending.items() if pending_day == day]
+            else:
+                row = self._connection.execute(
+                    'SELECT requests, prompt_tokens, completion_tokens, cost FROM usage WHERE day = ? AND key = ?',
+                    (day, key)
+                ).fetchone() or (0, 0, 0, 0.0)
+                pending = [self._pending[(day, key)]] if (day, key) in self._pending else []
+        totals = list(row)
+        for values in pending:
+            for i, value in enumerate(values):
+                totals[i] += value
+        return DailyUsage(*totals)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._connection.close()
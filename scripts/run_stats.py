@@ -0,0 +1,85 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from typing import Dict, Optional
+from output_layout import write_text_atomic
+
+
+class RunStats:
+    """
+    Live throughput statistics of a run. Results and tokens are kept with their
+    timestamps so rates can be computed over a rolling window.
+    """
+
+    def __init__(self, total: int, window: float = 60.0):
+        self.total = total
+        self.window = window
+        self.start_time = time.monotonic()
+        self.processed = 0
+        self.errors = 0
+        self.tokens = 0
+        self._results = deque()  # (timestamp, success)
+        self._tokens = deque()   # (timestamp, token count)
+        self._lock = threading.Lock()
+
+    def record_result(self, success: bool):
+        with self._lock:
+            self.processed += 1
+            if not success:
+                self.errors += 1
+            self._results.append((time.monotonic(), success))
+
+    def record_tokens(self, count: int):
+        with self._lock:
+            self.tokens += count
+            self._tokens.append((time.monotonic(), count))
+
+    def _trim(self, now: float):
+        while self._results and now - self._results[0][0] > self.window:
+            self._results.popleft()
+        while self._tokens and now - self._tokens[0][0] > self.window:
+            self._tokens.popleft()
+
+    def snapshot(self) -> Dict:
+        """Return the current rates, ETA and error rate."""
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            elapsed = now - self.start_time
+            span = min(elapsed, self.window) or 1e-9
+
+            images_per_second = len(self._results) / span
+            tokens_per_minute = sum(count for _, count in self._tokens) * 60 / span
+            recent_errors = sum(1 for _, success in self._results if not success)
+            error_rate = recent_errors / len(self._results) if self._results else 0.0
+
+            remaining = max(0, self.total - self.processed)
+            eta = remaining / images_per_second if images_per_second > 0 else None
+
+            return {
+                'elapsed_seconds': round(elapsed, 1),
+                'processed': self.processed,
+                'total': self.total,
+                'errors': self.errors,
+                'images_per_second': round(images_per_second, 3),
+                'tokens_per_minute': int(tokens_per_minute),
+                'tokens': self.tokens,
+                'error_rate': round(error_rate, 3),
+                'eta_seconds': round(eta, 1) if eta is not None else None,
+            }
+
+
+def write_status_file(path: str, status: Dict):
+    """Rewrite the status JSON file atomically so readers never see a partial file."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    write_text_atomic(path, json.dumps(status, indent=2))
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    """Format a number of seconds as H:MM:SS, or ? when unknown."""
+    if seconds is None:
+        return '?'
+    seconds = int(seconds)
+    return f'{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}'
@@ -0,0 +1,142 @@
+import os
+import json
+import time
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from output_layout import write_text_atomic
+
+# The outcome of checking a URL: whether it can be captioned, and why not
+PreflightResult = namedtuple('PreflightResult', ['ok', 'status', 'content_type', 'size', 'reason'])
+
+# Content types accepted besides image/*, for servers that do not label their images
+GENERIC_CONTENT_TYPES = ('application/octet-stream', 'binary/octet-stream')
+
+
+def _import_httpx():
+    # Newer OpenAI SDKs ship httpx2 in place of httpx
+    try:
+        import httpx
+    except ImportError:
+        import httpx2 as httpx
+    return httpx
+
+
+def _size_from_headers(headers, status: int) -> Optional[int]:
+    # A ranged response states the full size after the slash of Content-Range
+    content_range = headers.get('content-range', '')
+    if '/' in content_range:
+        total = content_range.rsplit('/', 1)[1].strip()
+        return int(total) if total.isdigit() else None
+    length = headers.get('content-length', '')
+    return int(length) if status == 200 and length.isdigit() else None
+
+
+def _classify(status: int, headers, max_bytes: int) -> PreflightResult:
+    content_type = headers.get('content-type', '').split(';')[0].strip().lower()
+    size = _size_from_headers(headers, status)
+    if status >= 400:
+        return PreflightResult(False, status, content_type, size, f'HTTP {status}')
+    if content_type and not content_type.startswith('image/') and content_type not in GENERIC_CONTENT_TYPES:
+        return PreflightResult(False, status, content_type, size, f'not an image ({content_type})')
+    if size is not None and max_bytes > 0 and size > max_bytes:
+        return PreflightResult(False, status, content_type, size, f'too large ({size / (1024 * 1024):.1f} MB)')
+    return PreflightResult(True, status, content_type, size, '')
+
+
+def _is_transient(result: PreflightResult) -> bool:
+    # Network errors, rate limits and server errors may pass on the next run, so they are not cached
+    return result.status is None or result.status in (408, 429) or result.status >= 500
+
+
+def check_url(client, url: str, max_bytes: int) -> PreflightResult:
+    """
+    Check that a URL is reachable and serves an image of an acceptable size.
+    A HEAD request is tried first. Servers that reject HEAD or leave out the
+    content type get a GET for the first byte, whose body is not read.
+    """
+    httpx = _import_httpx()
+    try:
+        response = client.head(url, follow_redirects=True)
+        if response.status_code < 400 and response.headers.get('content-type'):
+            return _classify(response.status_code, response.headers, max_bytes)
+        with client.stream('GET', url, headers={'Range': 'bytes=0-0'}, follow_redirects=True) as response:
+            return _classify(response.status_code, response.headers, max_bytes)
+    except httpx.HTTPError as e:
+        return PreflightResult(False, None, '', None, type(e).__name__)
+
+
+class PreflightCache:
+    """
+    Results of earlier URL checks, kept in a JSON file for ttl seconds so
+    repeated runs over the same URL lists do not check them again.
+    """
+
+    def __init__(self, path: str, ttl: float, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.clock = clock
+        self.entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = dict(json.load(f))
+        except (OSError, ValueError, TypeError):
+            self.entries = {}
+
+    def save(self):
+        now = self.clock()
+        with self._lock:
+            # Expired entries are dropped when the file is written
+            self.entries = {url: entry for url, entry in self.entries.items() if now - entry['checked'] < self.ttl}
+            data = json.dumps(self.entries)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        write_text_atomic(self.path, data)
+
+    def get(self, url: str) -> Optional[PreflightResult]:
+        with self._lock:
+            entry = self.entries.get(url)
+        if entry is None or self.clock() - entry['checked'] >= self.ttl:
+            return None
+        return PreflightResult(*entry['result'])
+
+    def put(self, url: str, result: PreflightResult):
+        if _is_transient(result):
+            return
+        with self._lock:
+            self.entries[url] = {'checked': self.clock(), 'result': list(result)}
+
+
+def preflight_urls(urls: List[str], cache: Optional[PreflightCache] = None, concurrency: int = 16,
+                   timeout: float = 10.0, max_bytes: int = 0) -> Dict[str, PreflightResult]:
+    """
+    Check many URLs concurrently over one pooled HTTP client and return the
+    result for each. URLs with a fresh cached result are not requested again.
+    """
+    results = {}
+    to_check = []
+    for url in dict.fromkeys(urls):
+        cached = cache.get(url) if cache else None
+        if cached is not None:
+            results[url] = cached
+        else:
+            to_check.append(url)
+
+    if to_check:
+        httpx = _import_httpx()
+        workers = max(1, min(concurrency, len(to_check)))
+        limits = httpx.Limits(max_connections=workers, max_keepalive_connections=workers)
+        with httpx.Client(timeout=timeout, limits=limits) as client:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                checked = executor.map(lambda url: check_url(client, url, max_bytes), to_check)
+                for url, result in zip(to_check, checked):
+                    results[url] = result
+                    if cache:
+                        cache.put(url, result)
+        if cache:
+            cache.save()
+    return results
@@ -0,0 +1,99 @@
+import os
+import importlib.util
+from collections import namedtuple
+from typing import List
+
+# OpenCV is optional and only needed for video inputs. It is imported when a
+# video is decoded, so starting the app does not load it and numpy.
+
+# File extensions accepted as local video inputs
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.webm', '.m4v')
+
+# A sampled frame: its position in seconds and the frame encoded as JPEG
+VideoFrame = namedtuple('VideoFrame', ['timestamp', 'data'])
+
+
+def is_video(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS
+
+
+def is_available() -> bool:
+    """Whether OpenCV is installed, which video inputs need."""
+    return importlib.util.find_spec('cv2') is not None
+
+
+def _histogram(frame):
+    import cv2
+    # Hue and saturation histogram of a small copy of the frame, for scene change detection
+    small = cv2.resize(frame, (64, 64), interpolation=cv2.INTER_AREA)
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    histogram = cv2.calcHist([hsv], [0, 1], None, [16, 16], [0, 180, 0, 256])
+    return cv2.normalize(histogram, histogram)
+
+
+def _encode(frame, max_side: int) -> bytes:
+    import cv2
+    height, width = frame.shape[:2]
+    if max(width, height) > max_side:
+        scale = max_side / max(width, height)
+        frame = cv2.resize(frame, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+    ok, data = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    if not ok:
+        raise ValueError('Could not encode frame')
+    return data.tobytes()
+
+
+def sample_frames(video_path: str, mode: str = 'interval', interval: float = 5.0, scene_threshold: float = 0.4,
+                  max_frames: int = 8, max_side: int = 2048) -> List[VideoFrame]:
+    """
+    Decode a video sequentially and return the sampled frames as JPEG data.
+
+    With the interval mode, a frame is taken every interval seconds, spread out
+    so at most max_frames cover the whole clip. With the scene mode, the first
+    frame and every frame that differs from the last sampled one by more than
+    scene_threshold (0 to 1) are taken. Frames are decoded in memory and
+    skipped frames are only grabbed, not converted.
+    """
+    try:
+        import cv2
+    except ImportError:
+        raise RuntimeError('OpenCV is not installed (pip install opencv-python-headless)')
+
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise ValueError(f'Could not open video: {video_path}')
+
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        if mode == 'interval' and frame_count > 0 and max_frames > 0:
+            interval = max(interval, frame_count / fps / max_frames)
+        # Scene changes are checked a few times per second, not on every frame
+        step = max(1, int(round(fps * (interval if mode == 'interval' else 0.25))))
+
+        frames = []
+        last_histogram = None
+        index = 0
+        while len(frames) < max_frames:
+            if not capture.grab():
+                break
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                if mode == 'scene':
+                    histogram = _histogram(frame)
+                    changed = last_histogram is None or cv2.compareHist(
+                        last_histogram, histogram, cv2.HISTCMP_BHATTACHARYYA) > scene_threshold
+                    if changed:
+                        last_histogram = histogram
+                        frames.append(VideoFrame(index / fps, _encode(frame, max_side)))
+                else:
+                    frames.append(VideoFrame(index / fps, _encode(frame, max_side)))
+            index += 1
+
+        if not frames:
+            raise ValueError(f'No frames could be decoded from {video_path}')
+        return frames
+    finally:
+        capture.release()
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# The modules live in scripts/ and import each other by name
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts')
+sys.path.insert(0, SCRIPTS_DIR)
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(monkeypatch, tmp_path):
+    """Keep the caches a test opens out of the real cache folder."""
+    import gptcaption
+    monkeypatch.setattr(gptcaption, 'CACHE_DIR', str(tmp_path / 'cache'))
+    # Opened on first use, so each test opens its own under the redirected folder
+    for name in ('output_budgets', 'output_index', 'quota_ledger', 'payload_cache'):
+        monkeypatch.setattr(gptcaption, name, None)
@@ -0,0 +1,81 @@
+import io
+import gzip
+import random
+import tarfile
+import zipfile
+
+from archive_inputs import MEMBER_SEPARATOR, ArchiveReader, CaptionArchives
+
+
+def make_tar(path, names):
+    with tarfile.open(path, 'w:gz') as archive:
+        for name in names:
+            data = name.encode('utf-8') * 1000
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+
+def count_rewinds(monkeypatch):
+    rewinds = []
+    original = gzip._GzipReader._rewind
+
+    def rewind(self):
+        rewinds.append(1)
+        original(self)
+
+    monkeypatch.setattr(gzip._GzipReader, '_rewind', rewind)
+    return rewinds
+
+
+def test_compressed_tar_is_read_in_one_pass(monkeypatch, tmp_path):
+    names = [f'images/{number:03d}.jpg' for number in range(100)]
+    stored = random.Random(0).sample(names, len(names))
+    archive_path = str(tmp_path / 'data.tar.gz')
+    make_tar(archive_path, stored)
+    paths = [f'{archive_path}{MEMBER_SEPARATOR}{name}' for name in names]
+
+    reader = ArchiveReader()
+    ordered = reader.in_stored_order(['http://example.com/a.jpg'] + paths)
+    assert ordered[0] == 'http://example.com/a.jpg'
+    assert ordered[1:] == [f'{archive_path}{MEMBER_SEPARATOR}{name}' for name in stored]
+
+    rewinds = count_rewinds(monkeypatch)
+    # Neighbours swapped, as concurrent requests may ask for them
+    for first, second in zip(ordered[1::2], ordered[2::2]):
+        for path in (second, first):
+            assert reader.read(path) == path.split(MEMBER_SEPARATOR)[1].encode('utf-8') * 1000
+    # Listing the members left the stream at its end, so only the first read goes back
+    assert len(rewinds) <= 1
+    reader.close()
+
+
+def test_compressed_tar_rereads_members_already_passed(tmp_path):
+    names = [f'{number}.png' for number in range(10)]
+    archive_path = str(tmp_path / 'data.tgz')
+    make_tar(archive_path, names)
+
+    reader = ArchiveReader(max_buffer_bytes=0)
+    for name in names[::-1] + names:
+        assert reader.read(f'{archive_path}{MEMBER_SEPARATOR}{name}') == name.encode('utf-8') * 1000
+    assert reader.stat(f'{archive_path}{MEMBER_SEPARATOR}5.png').st_size == 5000
+    reader.close()
+
+
+def test_rerun_replaces_captions_in_zip_archive(tmp_path):
+    zip_path = str(tmp_path / 'set_captions.zip')
+    first_run = CaptionArchives()
+    first_run.write(zip_path, 'inner/a.txt', 'first a')
+    first_run.write(zip_path, 'inner/b.txt', 'first b')
+    first_run.close()
+
+    second_run = CaptionArchives()
+    assert second_run.write(zip_path, 'inner/a.txt', 'second a') == f'{zip_path}{MEMBER_SEPARATOR}inner/a.txt'
+    second_run.write(zip_path, 'inner/c.txt', 'second c')
+    second_run.close()
+
+    with zipfile.ZipFile(zip_path) as archive:
+        assert sorted(archive.namelist()) == ['inner/a.txt', 'inner/b.txt', 'inner/c.txt']
+        assert archive.read('inner/a.txt') == b'second a'
+        assert archive.read('inner/b.txt') == b'first b'
+    assert [path.name for path in tmp_path.iterdir()] == ['set_captions.zip']
@@ -0,0 +1,25 @@
+from cascade import CascadeStats, check_caption
+
+
+def test_check_caption():
+    assert check_caption('A red square on green grass.', min_words=3) is None
+    assert check_caption('Red square.', min_words=3) == 'short'
+    assert check_caption('A red square on grass.', keywords=['Square', 'grass']) is None
+    assert check_caption('A red square on grass.', keywords=['circle']) == 'keywords'
+    assert check_caption('', min_words=0) is None
+
+
+def test_stats_per_stage():
+    stats = CascadeStats()
+    stats.record_request('cheap', 0.001, 1.0)
+    stats.record_request('cheap', 0.003, 3.0)
+    stats.record_request('strong', 0.02, 4.0)
+    stats.record_input()
+    stats.record_input('short')
+
+    assert stats.inputs == 2
+    assert stats.escalations == {'short': 1}
+    assert stats.average_cost('cheap') == 0.002
+    assert stats.average_latency('cheap') == 2.0
+    assert stats.average_latency('strong') == 4.0
+    assert stats.average_cost('unused') == 0.0
@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+
+import gptcaption
+from flow_control import ConcurrencyController, PayloadBudget, SpendGovernor
+from key_pool import ApiKey, KeyPool
+from output_budget import OutputBudgets
+from run_stats import RunStats
+
+
+def test_continuation_is_sent_within_the_key_limits(monkeypatch, tmp_path):
+    responses = [
+        gptcaption.Completion('A red squ', SimpleNamespace(prompt_tokens=100, completion_tokens=3, total_tokens=103), 'length', None),
+        gptcaption.Completion('are on grass.', SimpleNamespace(prompt_tokens=110, completion_tokens=4, total_tokens=114), 'stop', None),
+    ]
+    requests = []
+    key_pool = KeyPool([ApiKey('OPENAI_API_KEY', 'sk-test', '1', 500, 30000)])
+
+    def request_completion(key, request):
+        requests.append(request)
+        return responses[len(requests) - 1]
+
+    spend_governor = SpendGovernor(1.0, 0, 0.00001, 0.00003)
+    monkeypatch.setattr(gptcaption, 'CONTINUE_TRUNCATED', True)
+    monkeypatch.setattr(gptcaption, 'request_completion', request_completion)
+    monkeypatch.setattr(gptcaption, 'payload_budget', PayloadBudget(0))
+    monkeypatch.setattr(gptcaption, 'get_output_budgets', lambda: OutputBudgets(str(tmp_path / 'output_budgets.json')))
+    monkeypatch.setattr(gptcaption, 'concurrency_controller', ConcurrencyController(initial=1))
+    monkeypatch.setattr(gptcaption, 'key_pool', key_pool)
+    monkeypatch.setattr(gptcaption, 'spend_governor', spend_governor)
+    monkeypatch.setattr(gptcaption, 'run_stats', RunStats(1))
+    monkeypatch.setattr(gptcaption, 'resolution_var', gptcaption.HeadlessVar('1024'))
+
+    caption = gptcaption.caption_images(['http://example.com/a.jpg'], 'describe', 'http://example.com/a.jpg')
+
+    assert caption == 'A red square on grass.'
+    assert requests[1]['messages'][1] == {'role': 'assistant', 'content': 'A red squ'}
+    assert key_pool.keys[0].requests == 2
+    assert spend_governor.reserved_cost == 0
+    assert spend_governor.spent_tokens == 217
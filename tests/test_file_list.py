@@ -0,0 +1,25 @@
+import ntpath
+
+import file_list
+from archive_inputs import split_member
+from file_list import FileListModel
+
+
+def test_windows_member_paths_keep_their_separator(monkeypatch):
+    monkeypatch.setattr(file_list.os.path, 'abspath', ntpath.abspath)
+    model = FileListModel()
+
+    added = model.add([
+        r'C:\data\set.zip!/inner/x.jpg',
+        r'C:\data\..\data\set.zip!/inner/x.jpg',
+        r'C:\data\photo.jpg',
+    ])
+
+    assert added == 2
+    assert model.items() == [r'C:\data\photo.jpg', r'C:\data\set.zip!/inner/x.jpg']
+    assert split_member(model[1]) == (r'C:\data\set.zip', 'inner/x.jpg')
+
+
+def test_split_member_accepts_a_normalised_separator():
+    assert split_member(r'C:\data\set.zip!\inner\x.jpg') == (r'C:\data\set.zip', 'inner/x.jpg')
+    assert split_member('/data/set.tar.gz!/inner/x.jpg') == ('/data/set.tar.gz', 'inner/x.jpg')
@@ -0,0 +1,92 @@
+import time
+import threading
+import concurrent.futures
+
+import gptcaption
+from flow_control import HedgePolicy, SpendGovernor
+from key_pool import ApiKey
+from output_index import OutputIndex
+
+
+class ImmediateHedgePolicy(HedgePolicy):
+    """Hedge every request as soon as it is sent."""
+
+    def threshold(self):
+        return 0.0
+
+
+def test_hedged_pair_finishing_together(monkeypatch, tmp_path):
+    release = threading.Event()
+    calls = []
+
+    def analyze_image(image_url, instruction_text, status_callback=None, stream=False):
+        calls.append(image_url)
+        release.wait(5)
+        return 'a caption'
+
+    real_wait = concurrent.futures.wait
+
+    def late_wait(futures, timeout=None, return_when=None):
+        # Wake only once both requests of the pair are done, as a slow scheduler would
+        if len(futures) == 2:
+            release.set()
+        return real_wait(futures, timeout=5, return_when=concurrent.futures.ALL_COMPLETED)
+
+    written = []
+    output_index = OutputIndex(str(tmp_path / 'index.jsonl'))
+    monkeypatch.setattr(concurrent.futures, 'wait', late_wait)
+    monkeypatch.setattr(gptcaption, 'analyze_image', analyze_image)
+    monkeypatch.setattr(gptcaption, 'HedgePolicy', lambda fraction, total, percentile: ImmediateHedgePolicy(1.0, total))
+    monkeypatch.setattr(gptcaption, 'write_to_file', lambda description, filename, *args: written.append(filename) or str(tmp_path / filename))
+    monkeypatch.setattr(gptcaption, 'get_output_index', lambda: output_index)
+    monkeypatch.setattr(gptcaption, 'get_output_index_key', lambda image_url, instruction_text: OutputIndex.make_key(image_url, instruction_text))
+    monkeypatch.setattr(gptcaption, 'get_api_keys', lambda: [ApiKey('OPENAI_API_KEY', 'sk-test', '1', 500, 30000)])
+    monkeypatch.setattr(gptcaption, 'resolution_var', gptcaption.HeadlessVar('512'))
+    monkeypatch.setattr(gptcaption, 'total_images', 1)
+
+    gptcaption.process_images(['http://example.com/image.jpg'], 'describe', str(tmp_path), batch_mode=True)
+
+    assert len(calls) == 2
+    assert written == ['image']
+    stats = gptcaption.run_stats.snapshot()
+    assert (stats['processed'], stats['errors']) == (1, 0)
+
+
+def test_waiting_on_a_losing_duplicate_does_not_spin(monkeypatch, tmp_path):
+    loser_done = threading.Event()
+    calls = []
+    reserves = []
+
+    def analyze_image(image_url, instruction_text, status_callback=None, stream=False):
+        calls.append(image_url)
+        if len(calls) == 1:
+            # The original request loses to its duplicate but keeps running
+            time.sleep(1)
+            loser_done.set()
+        return 'a caption'
+
+    class HoldingGovernor(SpendGovernor):
+        def reserve(self, prompt_tokens, max_tokens, weight=1):
+            reserves.append(1)
+            # The first input and its duplicate go through; the second input waits for the loser to finish
+            if len(reserves) not in (1, 3) and not loser_done.is_set():
+                return None
+            return super().reserve(prompt_tokens, max_tokens, weight)
+
+    output_index = OutputIndex(str(tmp_path / 'index.jsonl'))
+    monkeypatch.setattr(gptcaption, 'analyze_image', analyze_image)
+    monkeypatch.setattr(gptcaption, 'SpendGovernor', HoldingGovernor)
+    monkeypatch.setattr(gptcaption, 'HedgePolicy', lambda fraction, total, percentile: ImmediateHedgePolicy(1.0, total))
+    monkeypatch.setattr(gptcaption, 'write_to_file', lambda description, filename, *args: str(tmp_path / filename))
+    monkeypatch.setattr(gptcaption, 'get_output_index', lambda: output_index)
+    monkeypatch.setattr(gptcaption, 'get_output_index_key', lambda image_url, instruction_text: OutputIndex.make_key(image_url, instruction_text))
+    monkeypatch.setattr(gptcaption, 'get_api_keys', lambda: [ApiKey('OPENAI_API_KEY', 'sk-test', '1', 500, 30000)])
+    monkeypatch.setattr(gptcaption, 'resolution_var', gptcaption.HeadlessVar('512'))
+    monkeypatch.setattr(gptcaption, 'INITIAL_CONCURRENCY', 2)
+    monkeypatch.setattr(gptcaption, 'total_images', 2)
+
+    gptcaption.process_images(['http://example.com/a.jpg', 'http://example.com/b.jpg'], 'describe', str(tmp_path), batch_mode=True)
+
+    assert calls[:2] == ['http://example.com/a.jpg'] * 2
+    # The scheduler blocks on the loser instead of looping while it runs
+    assert len(reserves) < 50
@@ -0,0 +1,78 @@
+import pytest
+
+from key_pool import ApiKey, KeyPool, PoolExhausted
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_pool(clock, *limits):
+    keys = [ApiKey(f'OPENAI_API_KEY_{n}', f'sk-{n}', '1', rpm, tpm) for n, (rpm, tpm) in enumerate(limits)]
+    return KeyPool(keys, cooldown=10.0, clock=clock)
+
+
+def test_requests_go_to_the_key_with_the_most_headroom():
+    clock = FakeClock()
+    pool = make_pool(clock, (10, 10000), (10, 40000))
+
+    first = pool.acquire(5000)
+    second = pool.acquire(5000)
+    pool.release(first, 5000, 5000)
+    pool.release(second, 5000, 5000)
+
+    assert first.name == 'OPENAI_API_KEY_1'
+    assert second.name == 'OPENAI_API_KEY_1'
+    assert pool.keys[1].window_tokens == 10000
+    # Once the second key is busier, a small request goes to the idle first key
+    for _ in range(5):
+        pool.release(pool.acquire(5000), 5000, 5000)
+    assert pool.acquire(1000).name == 'OPENAI_API_KEY_0'
+
+
+def test_full_key_is_used_again_after_a_minute():
+    clock = FakeClock()
+    pool = make_pool(clock, (1, 0))
+    key = pool.acquire(100)
+    pool.release(key, 100, 100)
+
+    with pytest.raises(TimeoutError):
+        pool.acquire(100, timeout=0)
+    clock.now += 61
+    assert pool.acquire(100) is key
+
+
+def test_rate_limited_key_cools_down_and_bad_keys_are_dropped():
+    clock = FakeClock()
+    pool = make_pool(clock, (10, 0), (10, 0))
+    first, second = pool.keys
+
+    assert pool.quarantine(first, seconds=5) is False
+    assert pool.acquire(100) is second
+    assert pool.quarantine(second, permanent=True) is True
+    assert pool.quarantine(second, permanent=True) is False
+
+    clock.now += 6
+    assert pool.acquire(100) is first
+    pool.quarantine(first, permanent=True)
+    with pytest.raises(PoolExhausted):
+        pool.acquire(100)
+
+
+def test_response_headers_lower_the_headroom():
+    clock = FakeClock()
+    pool = make_pool(clock, (100, 0), (100, 0))
+    first, second = pool.keys
+
+    pool.record_headers(first, {
+        'x-ratelimit-remaining-requests': '5',
+        'x-ratelimit-limit-requests': '100',
+        'x-ratelimit-remaining-tokens': 'unknown',
+    })
+
+    assert first.header_headroom == 0.05
+    assert pool.acquire(100) is second
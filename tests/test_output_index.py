@@ -0,0 +1,33 @@
+import zipfile
+
+from output_index import OutputIndex
+
+
+def test_lookup_ignores_deleted_caption(tmp_path):
+    index = OutputIndex(str(tmp_path / 'index.jsonl'))
+    caption = tmp_path / 'image.txt'
+    caption.write_text('a caption')
+    key = OutputIndex.make_key('http://example.com/image.jpg', 'describe')
+    index.record(key, str(caption))
+    assert index.lookup(key) == str(caption)
+
+    caption.unlink()
+    assert index.lookup(key) is None
+    # The entry survives a reload, and the check applies to it as well
+    assert OutputIndex(str(tmp_path / 'index.jsonl')).lookup(key) is None
+
+
+def test_lookup_checks_captions_in_zip_archives(tmp_path):
+    index = OutputIndex(str(tmp_path / 'index.jsonl'))
+    zip_path = tmp_path / 'data_captions.zip'
+    with zipfile.ZipFile(zip_path, 'w') as archive:
+        archive.writestr('a.txt', 'a caption')
+    present = OutputIndex.make_key('data.zip!/a.jpg', 'describe')
+    missing = OutputIndex.make_key('data.zip!/b.jpg', 'describe')
+    index.record(present, f'{zip_path}!/a.txt')
+    index.record(missing, f'{zip_path}!/b.txt')
+    assert index.lookup(present) == f'{zip_path}!/a.txt'
+    assert index.lookup(missing) is None
+
+    zip_path.unlink()
+    assert index.lookup(present) is None
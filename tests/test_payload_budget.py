@@ -0,0 +1,47 @@
+import time
+import threading
+
+import gptcaption
+from flow_control import ConcurrencyController, PayloadBudget
+from key_pool import ApiKey, KeyPool
+from run_stats import RunStats
+from video_frames import VideoFrame
+
+
+def test_multi_frame_requests_share_the_budget(monkeypatch):
+    frame_bytes = 2700 * 1024
+    budget = PayloadBudget(64 * 1024 * 1024)
+
+    def encode_image_file(image_path, detail='auto', data=None, resolution=None):
+        # Give the other requests time to take their share of the budget between frames
+        time.sleep(0.01)
+        return 'A' * (len(data) * 4 // 3), (1920, 1080), (1920, 1080)
+
+    def request_completion(key, request):
+        time.sleep(0.05)
+        return gptcaption.Completion('a caption', None, 'stop', None)
+
+    monkeypatch.setattr(gptcaption, 'payload_budget', budget)
+    monkeypatch.setattr(gptcaption, 'encode_image_file', encode_image_file)
+    monkeypatch.setattr(gptcaption, 'request_completion', request_completion)
+    monkeypatch.setattr(gptcaption, 'key_pool', KeyPool([ApiKey('OPENAI_API_KEY', 'sk-test', '1', 500, 10 ** 9)]))
+    monkeypatch.setattr(gptcaption, 'concurrency_controller', ConcurrencyController(initial=10))
+    monkeypatch.setattr(gptcaption, 'run_stats', RunStats(10))
+    monkeypatch.setattr(gptcaption, 'resolution_var', gptcaption.HeadlessVar('1024'))
+
+    captions = []
+
+    def caption_clip(number):
+        frames = [VideoFrame(i, bytes(frame_bytes)) for i in range(8)]
+        captions.append(gptcaption.caption_images(frames, 'describe', f'clip{number}.mp4'))
+
+    threads = [threading.Thread(target=caption_clip, args=(n,), daemon=True) for n in range(10)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 10
+    for thread in threads:
+        thread.join(max(0, deadline - time.monotonic()))
+
+    assert captions == ['a caption'] * 10
+    assert budget.in_flight == 0
+    assert budget.peak <= budget.max_bytes
@@ -0,0 +1,24 @@
+import os
+import hashlib
+
+from payload_cache import RECORD_HEADER, PayloadCache
+
+
+def make_key(number):
+    return hashlib.sha1(str(number).encode('utf-8')).hexdigest()
+
+
+def test_pack_file_stays_bounded_during_a_run(tmp_path):
+    cache = PayloadCache(str(tmp_path), max_bytes=10000)
+    record_size = RECORD_HEADER.size + 1000
+    for number in range(200):
+        cache.put(make_key(number), bytes([number]) * 1000, (100, 100), (50, 50))
+        assert os.path.getsize(cache.pack_path) <= 2 * cache.max_bytes + record_size
+
+    assert cache.live_bytes <= cache.max_bytes
+    assert cache.get(make_key(199))[0] == bytes([199]) * 1000
+    assert cache.get(make_key(0)) is None
+
+    cache.save()
+    reloaded = PayloadCache(str(tmp_path), max_bytes=10000)
+    assert reloaded.get(make_key(198)) == (bytes([198]) * 1000, (100, 100), (50, 50))
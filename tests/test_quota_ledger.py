@@ -0,0 +1,18 @@
+from quota_ledger import QuotaLedger
+
+
+def test_processes_share_the_ledger_without_wal(tmp_path):
+    path = str(tmp_path / 'cache' / 'quota.sqlite')
+    first = QuotaLedger(path)
+    second = QuotaLedger(path)
+    # WAL needs shared memory, which network drives do not provide
+    assert first._connection.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+
+    first.add('key', requests=2, prompt_tokens=100, cost=0.5)
+    second.add('key', requests=1, completion_tokens=10)
+    first.flush()
+    assert second.usage_today('key') == (3, 100, 10, 0.5)
+    second.close()
+    assert first.usage_today() == (3, 100, 10, 0.5)
+    first.close()
+    assert not (tmp_path / 'cache' / 'quota.sqlite-wal').exists()
@@ -0,0 +1,44 @@
+import sys
+import subprocess
+from conftest import SCRIPTS_DIR
+
+# Importing the app must stay cheap: the heavy dependencies are imported on the code paths that need them
+IMPORT_BUDGET_SECONDS = 0.3
+HEAVY_MODULES = ('openai', 'PIL', 'tkinter', 'cv2')
+
+
+def run_python(*args):
+    return subprocess.run(
+        [sys.executable] + list(args),
+        cwd=SCRIPTS_DIR,
+        capture_output=True,
+        text=True,
+        timeout=60
+    )
+
+
+def test_import_stays_within_budget():
+    result = run_python('-X', 'importtime', '-c', 'import gptcaption')
+    assert result.returncode == 0, result.stderr
+
+    # Lines look like "import time:  self [us] | cumulative | module"
+    cumulative = None
+    for line in result.stderr.splitlines():
+        parts = [part.strip() for part in line.split('|')]
+        if len(parts) == 3 and parts[2] == 'gptcaption':
+            cumulative = int(parts[1]) / 1e6
+    assert cumulative is not None, result.stderr
+    assert cumulative < IMPORT_BUDGET_SECONDS, f'importing gptcaption took {cumulative:.3f}s'
+
+
+def test_import_does_not_load_heavy_dependencies():
+    result = run_python('-c', 'import sys, gptcaption; print(",".join(sorted(sys.modules)))')
+    assert result.returncode == 0, result.stderr
+    loaded = set(result.stdout.strip().split(','))
+    assert not loaded.intersection(HEAVY_MODULES), sorted(loaded.intersection(HEAVY_MODULES))
+
+
+def test_help_runs_without_heavy_dependencies():
+    result = run_python('gptcaption.py', '--help')
+    assert result.returncode == 0, result.stderr
+    assert '--headless' in result.stdout
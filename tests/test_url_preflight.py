@@ -0,0 +1,99 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from url_preflight import PreflightCache, preflight_urls
+
+PNG = b'\x89PNG\r\n\x1a\n' + bytes(2040)
+
+
+class Handler(BaseHTTPRequestHandler):
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.requests.append(('HEAD', self.path))
+        if self.path == '/no-head.png':
+            self.send_response(405)
+            self.end_headers()
+        else:
+            self.respond(send_body=False)
+
+    def do_GET(self):
+        self.requests.append(('GET', self.path))
+        self.respond(send_body=True)
+
+    def respond(self, send_body):
+        if self.path == '/missing.png':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        content_type = 'text/html' if self.path == '/page.html' else 'image/png'
+        ranged = self.headers.get('Range') == 'bytes=0-0'
+        body = PNG[:1] if ranged else PNG
+        self.send_response(206 if ranged else 200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if ranged:
+            self.send_header('Content-Range', f'bytes 0-0/{len(PNG)}')
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    Handler.requests = []
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_address[1]}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_preflight_results(server):
+    results = preflight_urls([
+        f'{server}/image.png', f'{server}/no-head.png', f'{server}/page.html', f'{server}/missing.png'
+    ], max_bytes=1024 * 1024)
+
+    assert results[f'{server}/image.png'][:4] == (True, 200, 'image/png', len(PNG))
+    # HEAD is rejected, so a ranged GET reads the type and the full size instead
+    assert results[f'{server}/no-head.png'][:4] == (True, 206, 'image/png', len(PNG))
+    assert ('GET', '/no-head.png') in Handler.requests
+    assert not results[f'{server}/page.html'].ok
+    assert results[f'{server}/page.html'].reason == 'not an image (text/html)'
+    assert not results[f'{server}/missing.png'].ok
+    assert results[f'{server}/missing.png'].reason == 'HTTP 404'
+
+
+def test_preflight_rejects_large_images(server):
+    result = preflight_urls([f'{server}/image.png'], max_bytes=1024)[f'{server}/image.png']
+    assert not result.ok
+    assert result.size == len(PNG)
+
+
+def test_preflight_cache_reuse(server, tmp_path):
+    now = [1000.0]
+    cache = PreflightCache(str(tmp_path / 'preflight.json'), ttl=60, clock=lambda: now[0])
+    urls = [f'{server}/image.png', f'{server}/missing.png']
+
+    first = preflight_urls(urls, cache)
+    checked = {path for _, path in Handler.requests}
+    assert checked == {'/image.png', '/missing.png'}
+    count = len(Handler.requests)
+
+    # A later run within the TTL reads the results from the file
+    now[0] += 30
+    cache = PreflightCache(str(tmp_path / 'preflight.json'), ttl=60, clock=lambda: now[0])
+    assert preflight_urls(urls, cache) == first
+    assert len(Handler.requests) == count
+
+    # Once expired, the URLs are checked again
+    now[0] += 60
+    assert preflight_urls(urls, cache) == first
+    assert len(Handler.requests) == 2 * count